@@ -0,0 +1,61 @@
+"""Unique user_id and pending names
+
+Revision ID: 3f1c9a7d2b64
+Revises: aeb95397ebe3
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a7d2b64'
+down_revision = 'aeb95397ebe3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Concurrent first requests could insert the same user twice. Fold the
+    # duplicates into the oldest row before the index is made unique.
+    op.execute(
+        """
+        UPDATE users
+        SET onboarding = merged.onboarding,
+            is_test_passed = merged.is_test_passed,
+            attempts = merged.attempts
+        FROM (
+            SELECT user_id,
+                   min(id) AS id,
+                   bool_or(onboarding) AS onboarding,
+                   bool_or(is_test_passed) AS is_test_passed,
+                   sum(attempts) AS attempts
+            FROM users
+            GROUP BY user_id
+            HAVING count(*) > 1
+        ) AS merged
+        WHERE users.id = merged.id
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM users
+        USING users AS kept
+        WHERE users.user_id = kept.user_id AND users.id > kept.id
+        """
+    )
+    op.drop_index('ix_users_user_id', table_name='users')
+    op.create_index(op.f('ix_users_user_id'), 'users', ['user_id'], unique=True)
+    op.add_column(
+        'users',
+        sa.Column(
+            'names_pending', sa.Boolean(), server_default=sa.false(), nullable=False
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'names_pending')
+    op.drop_index(op.f('ix_users_user_id'), table_name='users')
+    op.create_index(op.f('ix_users_user_id'), 'users', ['user_id'], unique=False)
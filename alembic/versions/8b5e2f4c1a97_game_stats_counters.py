@@ -0,0 +1,77 @@
+"""Game statistics counters
+
+Revision ID: 8b5e2f4c1a97
+Revises: 3f1c9a7d2b64
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# The trigger SQL lives with the code reading the counters, written with
+# CREATE OR REPLACE so later migrations changing it can run it again.
+from app.db.game_stats import ATTEMPTS_BUCKETS
+from app.db.game_stats import GAME_STATS_SHARDS
+from app.db.game_stats import TRIGGER_DDL
+
+
+# revision identifiers, used by Alembic.
+revision = '8b5e2f4c1a97'
+down_revision = '3f1c9a7d2b64'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'game_stats',
+        sa.Column('shard', sa.Integer(), nullable=False),
+        sa.Column('players', sa.BigInteger(), nullable=False),
+        sa.Column('onboarded', sa.BigInteger(), nullable=False),
+        sa.Column('passed', sa.BigInteger(), nullable=False),
+        sa.Column('attempts', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('shard'),
+    )
+    op.create_table(
+        'attempts_histogram',
+        sa.Column('shard', sa.Integer(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('players', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('shard', 'attempts'),
+    )
+    # Creating the triggers locks users against writes until the migration
+    # commits, so the backfill below and the triggers never count a change
+    # twice, even with the app running.
+    for statement in TRIGGER_DDL:
+        op.execute(statement)
+    # Counters start from the users already there.
+    op.execute(
+        f"""
+        INSERT INTO game_stats (shard, players, onboarded, passed, attempts)
+        SELECT user_id % {GAME_STATS_SHARDS},
+               count(*),
+               count(*) FILTER (WHERE onboarding),
+               count(*) FILTER (WHERE is_test_passed),
+               coalesce(sum(attempts), 0)
+        FROM users
+        GROUP BY 1
+        """
+    )
+    op.execute(
+        f"""
+        INSERT INTO attempts_histogram (shard, attempts, players)
+        SELECT user_id % {GAME_STATS_SHARDS},
+               least(attempts, {ATTEMPTS_BUCKETS}),
+               count(*)
+        FROM users
+        GROUP BY 1, 2
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute('DROP TRIGGER game_stats_update ON users')
+    op.execute('DROP TRIGGER game_stats_insert ON users')
+    op.execute('DROP FUNCTION game_stats_users_update()')
+    op.execute('DROP FUNCTION game_stats_users_insert()')
+    op.drop_table('attempts_histogram')
+    op.drop_table('game_stats')
@@ -1,2 +1,3 @@
 from .endpoints import users_router
 from .endpoints import planets_router
+from .endpoints import admin_router
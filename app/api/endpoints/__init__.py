@@ -1,2 +1,3 @@
 from .users import router as users_router
 from .planets import router as planets_router
+from .admin import router as admin_router
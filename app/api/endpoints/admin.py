@@ -0,0 +1,94 @@
+from typing import Annotated
+from typing import Literal
+
+from fastapi import APIRouter
+from fastapi import Depends
+from fastapi import Query
+from fastapi.responses import StreamingResponse
+
+from ...db import users_queries
+from ...db.export import EXPORT_FORMATS
+from ...db.export import export_users
+
+from .dependencies import admin_check
+
+from ..models.stats import GameStatsModel
+
+router = APIRouter(dependencies=[Depends(admin_check)])
+
+
+responses = {
+    200: {
+        "description": "Success response",
+        "content": {
+            "application/json": {
+                "example": {
+                    "players": 1200,
+                    "onboarded": 1100,
+                    "passed": 300,
+                    "attempts": 2400,
+                    "onboarding_rate": 0.9166666666666666,
+                    "pass_rate": 0.25,
+                    "attempts_distribution": {"0": 150, "1": 500, "2": 400, "20+": 2},
+                }
+            }
+        },
+    }
+}
+
+
+@router.get(
+    "/stats",
+    name="Get game statistics",
+    tags=["Admin"],
+    response_model=GameStatsModel,
+    responses=responses,
+)
+async def admin_stats_get() -> dict:
+    """# Get game statistics #
+    Created for marketing: totals of players, onboarding and passed tests, and how many attempts players needed.
+    Read from counters kept up to date by every change of a user, so the users table is never scanned.
+    """
+
+    return await users_queries.get_game_stats()
+
+
+responses = {
+    200: {
+        "description": "Success response",
+        "content": {
+            "text/csv": {
+                "example": "user_id,onboarding,is_test_passed,attempts,"
+                "first_name,last_name\n1234567,True,True,2,Lev,Kurapov\n"
+            },
+            "application/x-ndjson": {
+                "example": '{"user_id":1234567,"onboarding":true,"is_test_passed":true,'
+                '"attempts":2,"first_name":"Lev","last_name":"Kurapov"}\n'
+            },
+        },
+    }
+}
+
+
+@router.get(
+    "/export/users",
+    name="Export users",
+    tags=["Admin"],
+    response_class=StreamingResponse,
+    responses=responses,
+)
+async def admin_export_users(
+    fmt: Annotated[Literal["csv", "ndjson"], Query(alias="format")] = "csv",
+    is_test_passed: Annotated[bool | None, Query()] = None,
+    onboarding: Annotated[bool | None, Query()] = None,
+) -> StreamingResponse:
+    """# Export users #
+    Created to hand out prizes: streams the users, optionally only those who passed the test, as CSV or NDJSON.
+    Rows are read through a server-side cursor and sent chunk by chunk, so any number of users can be exported.
+    """
+
+    return StreamingResponse(
+        export_users(fmt, is_test_passed=is_test_passed, onboarding=onboarding),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="users.{fmt}"'},
+    )
@@ -1,15 +1,9 @@
 import os
+import hmac
+import time
+import asyncio
 import datetime
 
-from PIL import Image
-from PIL import ImageDraw
-from PIL import ImageFont
-
-from base64 import b64encode
-from hashlib import sha256
-from hmac import HMAC
-from urllib.parse import urlencode
-
 from typing import Annotated
 from fastapi.security import APIKeyHeader
 from fastapi import Depends
@@ -17,108 +11,141 @@ from fastapi import Body
 from fastapi import HTTPException
 from fastapi import status
 
+from ..launch_params import InvalidSignature
+from ..launch_params import LaunchParamsVerifier
+from ..launch_params import MalformedLaunchParams
 from ..models.planets import PlanetModelCheckIn
-from ..models.planets import PlanetModelCheckOut
-from ..models.planets import planets_list
+from ..models.planets import planets_dict
+
+from ...lru import TTLCache
 
+from ...db.core import advisory_lock
+from ...db.users_queries import get_names
 from ...db.users_queries import get_or_create_user
+from ...db.users_queries import iter_passed_user_ids
+
+from ...tickets import TICKET_FORMATS
+from ...tickets import VARIANTS
+from ...tickets import CachedTicket
+from ...tickets import media_type
+from ...tickets import record_sizes
+from ...tickets import render_executor
+from ...tickets import render_ticket
+from ...tickets import ticket_cache
+from ...tickets import ticket_flight
+from ...tickets import ticket_key
+from ...tickets import ticket_prerender
+from ...tickets import ticket_storage
 
 VK_SECRET = os.getenv("VK_SECRET")
+VK_SIGN_CACHE_SIZE = int(os.getenv("VK_SIGN_CACHE_SIZE", 100000))
+VK_SIGN_CACHE_TTL = float(os.getenv("VK_SIGN_CACHE_TTL", 3600))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Any constant shared by the workers, the backfill runs in whichever of them
+# takes this advisory lock first.
+TICKET_BACKFILL_LOCK = 0x7469636B
+
 auth_header = APIKeyHeader(name="Authorization", scheme_name="VkMALaunchParams")
+launch_params_verifier = LaunchParamsVerifier(
+    VK_SECRET, TTLCache(VK_SIGN_CACHE_SIZE, VK_SIGN_CACHE_TTL)
+)
 
 
 async def vk_sign_check(
     launch_params: Annotated[str, Depends(auth_header)]
 ) -> int | HTTPException:
-    launch_params = launch_params[3:]
-    items = launch_params.split("&")
-    query = {}
-    for item in items:
-        key, value = item.split("=")
-        query[key] = value
-
-    if not query.get("sign"):
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
-
-    vk_subset = sorted(filter(lambda key: key.startswith("vk_"), query))
-
-    if not vk_subset:
+    try:
+        return launch_params_verifier.verify(launch_params)
+    except MalformedLaunchParams:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+    except InvalidSignature:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
 
-    ordered = {k: query[k] for k in vk_subset}
 
-    hash_code = b64encode(
-        HMAC(
-            VK_SECRET.encode(), urlencode(ordered, doseq=True).encode(), sha256
-        ).digest()
-    ).decode("utf-8")
+admin_header = APIKeyHeader(name="X-Admin-Token", scheme_name="AdminToken")
 
-    if hash_code[-1] == "=":
-        hash_code = hash_code[:-1]
 
-    fixed_hash = hash_code.replace("+", "-").replace("/", "_")
-    if not query.get("sign") == fixed_hash:
+async def admin_check(token: Annotated[str, Depends(admin_header)]) -> None:
+    # Without ADMIN_TOKEN the admin endpoints stay closed. Compared as bytes:
+    # compare_digest rejects str with non-ASCII characters.
+    if not ADMIN_TOKEN or not hmac.compare_digest(
+        token.encode(), ADMIN_TOKEN.encode()
+    ):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
-    else:
-        return int(query["vk_user_id"])
 
 
-async def generate_ticket(vk_user_id: int, low_quality: bool) -> None:
+async def generate_ticket(vk_user_id: int, fmt: str = "png") -> dict[bool, bytes]:
     db_user = await get_or_create_user(vk_user_id)
+    first_name, last_name = await get_names(db_user)
     datetime_entity = datetime.datetime.now() + datetime.timedelta(hours=3)
-    day = str(datetime_entity.day)
-    if len(day) == 1:
-        day = "0" + day
 
-    month = str(datetime_entity.month)
-    if len(month) == 1:
-        month = "0" + month
-
-    year = str(datetime_entity.year)[2:]
-
-    hour = str(datetime_entity.hour)
-    if len(hour) == 1:
-        hour = "0" + hour
-
-    minute = str(datetime_entity.minute)
-    if len(minute) == 1:
-        minute = "0" + minute
-
-    font_path = "media/fonts/VK Sans Display Bold.otf"
-    image = Image.open("media/tickets/base.png")
-    draw = ImageDraw.Draw(image)
-    font_size = 133
-    font = ImageFont.truetype(font_path, font_size)
-    text_color = (112, 0, 255)
-
-    text_position = (1357, 457)
-    text = db_user.first_name
-    draw.text(text_position, text, font=font, fill=text_color)
+    bodies = await render_executor.run(
+        render_ticket,
+        first_name,
+        last_name,
+        datetime_entity.strftime("%d.%m.%y"),
+        datetime_entity.strftime("%H:%M"),
+        fmt,
+    )
+    record_sizes(fmt, bodies)
+    stored = {
+        ticket_key(vk_user_id, variant, fmt): body for variant, body in bodies.items()
+    }
+    await asyncio.to_thread(ticket_storage.save_all, stored)
+    return bodies
+
+
+async def get_ticket(vk_user_id: int, low_quality: bool, fmt: str) -> CachedTicket:
+    entry = ticket_cache.get((vk_user_id, low_quality, fmt))
+    if entry is not None:
+        return entry
+
+    # One render produces every variant, so concurrent requests for either
+    # variant of the same format share it.
+    entries = await ticket_flight.do(
+        (vk_user_id, fmt), _load_or_generate_tickets, vk_user_id, fmt
+    )
+    return entries[low_quality]
+
+
+async def _load_or_generate_tickets(vk_user_id: int, fmt: str) -> dict:
+    keys = {variant: ticket_key(vk_user_id, variant, fmt) for variant in VARIANTS}
+    stored = await asyncio.to_thread(ticket_storage.load, keys)
+    if stored is not None:
+        entries = {
+            variant: CachedTicket(body, media_type(fmt), modified)
+            for variant, (body, modified) in stored.items()
+        }
+    else:
+        bodies = await generate_ticket(vk_user_id, fmt)
+        modified = time.time()
+        entries = {
+            variant: CachedTicket(body, media_type(fmt), modified)
+            for variant, body in bodies.items()
+        }
 
-    text_position = (1357, 595)
-    text = db_user.last_name
-    draw.text(text_position, text, font=font, fill=text_color)
+    for variant, entry in entries.items():
+        ticket_cache.put((vk_user_id, variant, fmt), entry)
+    return entries
 
-    font_path = "media/fonts/VK Sans Display Light.otf"
-    font_size = 80
-    font = ImageFont.truetype(font_path, font_size)
-    text_color = (255, 255, 255)
 
-    text_position = (1361, 1063)
-    text = f"{day}.{month}.{year}"
-    draw.text(text_position, text, font=font, fill=text_color)
+async def prerender_ticket(vk_user_id: int) -> None:
+    # Only the format most clients get, the others are rendered on demand:
+    # prerendering runs during the very bursts it is there to smooth.
+    await get_ticket(vk_user_id, False, TICKET_FORMATS[0])
 
-    text_position = (1717, 1063)
-    text = f"{hour}:{minute}"
-    draw.text(text_position, text, font=font, fill=text_color)
 
-    save_path = f"media/tickets/{vk_user_id}.png"
-    if low_quality:
-        width, height = image.size
-        image = image.resize((width // 3, height // 3))
-        save_path = f"media/tickets/{vk_user_id}low.png"
+async def backfill_tickets() -> None:
+    # Every worker starts a backfill, but rendering is only deduplicated
+    # within one process, so a single worker does it.
+    async with advisory_lock(TICKET_BACKFILL_LOCK) as locked:
+        if not locked:
+            return
 
-    image.save(save_path)
+        async for vk_user_id in iter_passed_user_ids():
+            key = ticket_key(vk_user_id, False, TICKET_FORMATS[0])
+            if not await asyncio.to_thread(ticket_storage.exists, key):
+                await ticket_prerender.put(vk_user_id)
 
 
 example = {
@@ -135,26 +162,21 @@ example = {
 
 async def codes_check(
     answers: Annotated[dict[str, PlanetModelCheckIn], Body(example=example)]
-):
+) -> dict[str, dict]:
     if not len(answers) == 8:
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY)
 
-    planets_dict = {obj.planet: obj for obj in planets_list}
-
     result = {}
-    for key in planets_dict.keys():
-        if not answers.get(key):
+    for key, planet in planets_dict.items():
+        answer = answers.get(key)
+        if answer is None:
             raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY)
 
-        obj = PlanetModelCheckOut(
-            club_id=planets_dict[key].club_id,
-            planet=planets_dict[key].planet,
-            user_code=answers[key].user_code,
-        )
-
-        if answers[key].user_code == planets_dict[key].code:
-            obj.code_is_valid = True
-
-        result[key] = obj
+        result[key] = {
+            "club_id": planet.club_id,
+            "planet": planet.planet,
+            "user_code": answer.user_code,
+            "code_is_valid": answer.user_code == planet.code,
+        }
 
     return result
@@ -1,4 +1,3 @@
-import os
 from enum import Enum
 
 from typing import Any
@@ -7,19 +6,26 @@ from typing import Annotated
 
 from fastapi import APIRouter
 from fastapi import Depends
+from fastapi import Request
 from fastapi import status
 from fastapi import HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import ORJSONResponse
+from fastapi.responses import RedirectResponse
+from fastapi.responses import Response
 
 from ..models.planets import PlanetModel
 from ..models.planets import PlanetModelCheckOut
-from ..models.planets import planets_list
+from ..models.planets import planets_json
 
 from ...db import users_queries
 
 from .dependencies import vk_sign_check
 from .dependencies import codes_check
 
+from ...static_assets import StaticAsset
+from ...static_assets import static_assets
+from ...tickets import ticket_prerender
+
 
 router = APIRouter()
 
@@ -69,18 +75,30 @@ async def planets_get(vk_user_id: Annotated[int, Depends(vk_sign_check)]) -> Any
     Created for rendering and connecting data on the frontend side of the application.
     """
 
-    result = {}
-    for planet in planets_list:
-        result[planet.planet] = planet.dict()
+    return Response(content=planets_json, media_type="application/json")
+
+
+def static_response(request: Request, asset: StaticAsset, cache_control: str):
+    headers = {
+        "ETag": asset.etag,
+        "Cache-Control": cache_control,
+        "Vary": "Accept-Encoding",
+    }
+    if asset.not_modified(request.headers.get("if-none-match")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
 
-    return result
+    encoding, body = asset.encode(request.headers.get("accept-encoding"))
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 responses = {
     200: {
         "description": "Success response",
         "content": {"application/json": {"example": "JSON dict"}},
-    }
+    },
+    304: {"description": "File not modified since the cached copy"},
 }
 
 
@@ -90,18 +108,70 @@ responses = {
     tags=["Planets"],
     responses=responses,
 )
-async def static_get(file_path: StaticFilesEnum):
+async def static_get(request: Request, file_path: StaticFilesEnum):
     """# Get .json files of planets #
     Created for design rendering. Pictures are placed on the backend for the convenience of replacing images.
     """
-    file_full_path = f"static/{file_path}"
+    asset = static_assets.get(file_path.value)
+
+    if asset is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="File not found"
+        )
+
+    return static_response(request, asset, "public, no-cache")
+
+
+@router.get(
+    "/static/{digest}/{file_path}",
+    name="Get content-hashed .json files of planets",
+    tags=["Planets"],
+    responses=responses,
+)
+async def static_get_hashed(request: Request, digest: str, file_path: StaticFilesEnum):
+    """# Get content-hashed .json files of planets #
+    Same files as `/getstatic`, under URLs that change with the content, so they can be cached forever.
+    """
+    asset = static_assets.get(file_path.value)
 
-    if not os.path.isfile(file_full_path):
+    if asset is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="File not found"
         )
 
-    return FileResponse(path=file_full_path)
+    if digest != asset.digest:
+        prefix = request.url.path.rsplit("/", 2)[0]
+        return RedirectResponse(f"{prefix}/{asset.digest}/{asset.name}")
+
+    return static_response(request, asset, "public, max-age=31536000, immutable")
+
+
+responses = {
+    200: {
+        "description": "Success response",
+        "content": {
+            "application/json": {
+                "example": {
+                    "mercury.json": "/planets/static/0123456789abcdef/mercury.json"
+                }
+            }
+        },
+    }
+}
+
+
+@router.get(
+    "/getstaticurls",
+    name="Get content-hashed URLs of .json files of planets",
+    tags=["Planets"],
+    responses=responses,
+)
+async def static_urls_get(request: Request) -> dict:
+    """# Get content-hashed URLs of .json files of planets #
+    Created so the frontend can load the planet files from URLs that are safe to cache indefinitely.
+    """
+    prefix = request.url.path.rsplit("/", 1)[0]
+    return static_assets.urls(f"{prefix}/static")
 
 
 responses = {
@@ -174,28 +244,19 @@ responses = {
 )
 async def test_pass(
     vk_user_id: Annotated[int, Depends(vk_sign_check)],
-    result: Annotated[dict[str, PlanetModelCheckOut], Depends(codes_check)],
+    result: Annotated[dict[str, dict], Depends(codes_check)],
 ) -> Any:
     """# Check the codes entered by the user #
     Created to check the codes for each of the planets for compliance with the desired values.
     """
 
-    if not await users_queries.update_attempts_count(vk_user_id):
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
-        )
-
-    fail_flag = False
-    for key in result.keys():
-        if not result[key].code_is_valid:
-            fail_flag = True
-            break
+    passed = all(item["code_is_valid"] for item in result.values())
 
-    if fail_flag:
-        return result
-
-    if not await users_queries.set_test_passed(vk_user_id):
+    if not await users_queries.record_attempt(vk_user_id, passed):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
-    return result
+
+    if passed:
+        ticket_prerender.submit(vk_user_id)
+    return ORJSONResponse(result)
@@ -1,24 +1,29 @@
-import os
-
 from typing import Annotated
 from fastapi import APIRouter
 from fastapi import Depends
 from fastapi import Query
+from fastapi import Request
 from fastapi import HTTPException
 from fastapi import status
 
 from fastapi.responses import JSONResponse
-from fastapi.responses import FileResponse
+from fastapi.responses import ORJSONResponse
+from fastapi.responses import Response
 
 from ...db import users_queries
+from ...db.attempts_buffer import attempts_buffer
 
 from .dependencies import vk_sign_check
-from .dependencies import generate_ticket
+from .dependencies import get_ticket
 
 from ..models.users import UserModel
 
+from ...tickets import negotiate_format
+
 router = APIRouter()
 
+user_fields = tuple(UserModel.__fields__)
+
 
 responses = {
     200: {
@@ -32,6 +37,7 @@ responses = {
                     "attempts": 0,
                     "first_name": "Lev",
                     "last_name": "Kurapov",
+                    "names_pending": False,
                 }
             }
         },
@@ -49,18 +55,25 @@ responses = {
 async def users_get(vk_user_id: Annotated[int, Depends(vk_sign_check)]):
     """# Get all user information #
     Created to get information about the playing user, to display correct data and send data to the database.
+    New users get `names_pending: true` until their names arrive from VK.
     """
 
     db_user = await users_queries.get_or_create_user(vk_user_id)
-    user_model = UserModel.from_orm(db_user)
-    return user_model
+    user = {field: getattr(db_user, field) for field in user_fields}
+    user["attempts"] += attempts_buffer.pending(vk_user_id)
+    return ORJSONResponse(user)
 
 
 responses = {
     200: {
         "description": "Success response",
-        "content": {"application/json": {"example": {".png file"}}},
-    }
+        "content": {
+            "image/png": {"example": ".png file"},
+            "image/webp": {"example": ".webp file"},
+            "image/avif": {"example": ".avif file"},
+        },
+    },
+    304: {"description": "Ticket not modified since the cached copy"},
 }
 
 
@@ -72,9 +85,10 @@ responses = {
     responses=responses,
 )
 async def users_getticket(
+    request: Request,
     vk_user_id: Annotated[int, Depends(vk_sign_check)],
     low_quality: Annotated[bool, Query(description="Get low quality image if true")],
-) -> FileResponse | HTTPException:
+) -> Response | HTTPException:
     """# Get user's ticket image #
     Created to generate a user ticket with the date and time of receipt, to issue a prize for completing the game.
     """
@@ -82,15 +96,21 @@ async def users_getticket(
     if not await users_queries.check_finished(vk_user_id):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
 
-    file_path = f"media/tickets/{vk_user_id}.png"
-    if low_quality:
-        file_path = f"media/tickets/{vk_user_id}low.png"
+    fmt = negotiate_format(request.headers.get("accept"))
+    ticket = await get_ticket(vk_user_id, low_quality, fmt)
+    headers = {
+        "ETag": ticket.etag,
+        "Last-Modified": ticket.last_modified,
+        "Cache-Control": "private, no-cache",
+        "Vary": "Accept",
+    }
 
-    if os.path.isfile(file_path):
-        return FileResponse(path=file_path)
+    if ticket.not_modified(
+        request.headers.get("if-none-match"), request.headers.get("if-modified-since")
+    ):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
 
-    await generate_ticket(vk_user_id, low_quality)
-    return FileResponse(path=file_path)
+    return Response(content=ticket.body, media_type=ticket.media_type, headers=headers)
 
 
 responses = {
@@ -0,0 +1,87 @@
+import re
+import hmac
+
+from base64 import urlsafe_b64encode
+from hashlib import sha256
+from urllib.parse import quote_plus
+
+from .. import metrics
+from ..lru import TTLCache
+
+# Characters quote_plus leaves untouched; values made only of these are
+# signed as is without going through the quoting machinery.
+_UNQUOTED = re.compile(r"[A-Za-z0-9_.~-]*")
+
+sign_cache_hits = metrics.Counter(
+    "vk_sign_cache_hits", "Launch params accepted from the verified cache"
+)
+sign_cache_misses = metrics.Counter(
+    "vk_sign_cache_misses", "Launch params that had to be verified with HMAC"
+)
+
+
+def _quote(value: str) -> str:
+    if _UNQUOTED.fullmatch(value):
+        return value
+    return quote_plus(value)
+
+
+class MalformedLaunchParams(ValueError):
+    pass
+
+
+class InvalidSignature(ValueError):
+    pass
+
+
+class LaunchParamsVerifier:
+    def __init__(self, secret: str | None, cache: TTLCache) -> None:
+        self._mac = None
+        if secret is not None:
+            self._mac = hmac.new(secret.encode(), digestmod=sha256)
+        self.cache = cache
+
+    def sign(self, vk_params: dict[str, str]) -> str:
+        if self._mac is None:
+            raise RuntimeError("VK_SECRET is not set")
+
+        message = "&".join(
+            f"{_quote(key)}={_quote(vk_params[key])}" for key in sorted(vk_params)
+        )
+        mac = self._mac.copy()
+        mac.update(message.encode())
+        return urlsafe_b64encode(mac.digest()).decode().rstrip("=")
+
+    def verify(self, launch_params: str) -> int:
+        vk_user_id = self.cache.get(launch_params)
+        if vk_user_id is not None:
+            sign_cache_hits.inc()
+            return vk_user_id
+        sign_cache_misses.inc()
+
+        sign = None
+        vk_params = {}
+        for item in launch_params[3:].split("&"):
+            key, separator, value = item.partition("=")
+            if not separator or "=" in value:
+                raise MalformedLaunchParams(item)
+            if key == "sign":
+                sign = value
+            elif key.startswith("vk_"):
+                vk_params[key] = value
+
+        if not sign or not vk_params:
+            raise MalformedLaunchParams(launch_params)
+
+        try:
+            vk_user_id = int(vk_params["vk_user_id"])
+        except (KeyError, ValueError):
+            raise MalformedLaunchParams(launch_params)
+
+        # Compared as bytes: compare_digest rejects str with non-ASCII
+        # characters, and headers can carry any latin-1 text.
+        if not hmac.compare_digest(sign.encode(), self.sign(vk_params).encode()):
+            raise InvalidSignature(launch_params)
+
+        self.cache.set(launch_params, vk_user_id)
+        return vk_user_id
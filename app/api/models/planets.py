@@ -1,3 +1,5 @@
+import orjson
+
 from pydantic import BaseModel
 
 
@@ -28,3 +30,9 @@ uranus = PlanetModelDatabase(club_id=106360242, code=1, planet="uranus")
 neptune = PlanetModelDatabase(club_id=218344798, code=1, planet="neptune")
 
 planets_list = [mercury, venus, earth, mars, jupiter, saturn, uranus, neptune]
+
+# Compiled once at import: lookup by name and the /planets/get response body.
+planets_dict = {planet.planet: planet for planet in planets_list}
+planets_json = orjson.dumps(
+    {planet.planet: PlanetModel(**planet.dict()).dict() for planet in planets_list}
+)
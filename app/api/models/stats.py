@@ -0,0 +1,11 @@
+from pydantic import BaseModel
+
+
+class GameStatsModel(BaseModel):
+    players: int
+    onboarded: int
+    passed: int
+    attempts: int
+    onboarding_rate: float
+    pass_rate: float
+    attempts_distribution: dict[str, int]
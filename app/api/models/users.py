@@ -8,6 +8,7 @@ class UserModel(BaseModel):
     attempts: int
     first_name: str
     last_name: str
+    names_pending: bool = False
 
     class Config:
         orm_mode = True
@@ -1,8 +1,42 @@
+import os
+import asyncio
+import logging
+
+from fastapi import Depends
 from fastapi import FastAPI
 from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
+from fastapi.responses import Response
+from sqlalchemy.exc import SQLAlchemyError
 
+from . import metrics
 from .api import users_router
 from .api import planets_router
+from .api import admin_router
+from .api.endpoints.dependencies import backfill_tickets
+from .api.endpoints.dependencies import prerender_ticket
+from .api.endpoints.planets import StaticFilesEnum
+from .db import request_session
+from .db.core import engine
+from .db.core import ping
+from .db.attempts_buffer import attempts_buffer
+from .db.dependencies import VkApiError
+from .db.dependencies import vk_client
+from .db.user_cache import user_cache
+from .db.users_queries import write_attempts
+from .loop_lag import loop_lag_monitor
+from .middleware import MetricsMiddleware
+from .profiling import PROFILING_ENABLED
+from .profiling import ProfilingMiddleware
+from .static_assets import static_assets
+from .tickets import TICKET_PRERENDER_BACKFILL
+from .tickets import render_executor
+from .tickets import ticket_gc
+from .tickets import ticket_prerender
+
+TICKET_DRAIN_TIMEOUT = float(os.getenv("TICKET_DRAIN_TIMEOUT", 20))
+
+logger = logging.getLogger(__name__)
 
 title = "summary-vkstar23"
 description = """# VK mini app - Star23 #
@@ -30,12 +64,87 @@ app = FastAPI(
         "url": "https://github.com/kur-up",
         "email": "kurup.performance@gmail.com",
     },
+    dependencies=[Depends(request_session)],
+    default_response_class=ORJSONResponse,
 )
+app.state.ready = False
 
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
 app.include_router(users_router, prefix="/users")
 app.include_router(planets_router, prefix="/planets")
+app.include_router(admin_router, prefix="/admin")
+
+
+@app.exception_handler(VkApiError)
+async def vk_api_error_handler(request, exc):
+    return JSONResponse(status_code=502, content={"detail": "VK API is unavailable"})
 
 
 @app.get("/health", include_in_schema=False)
 async def health_get():
+    # Readiness: stays 503 until warm-up has finished and again while the
+    # worker is shutting down.
+    if not app.state.ready:
+        return JSONResponse(status_code=503, content="Warming up")
     return JSONResponse(status_code=200, content="OK")
+
+
+@app.get("/stats", include_in_schema=False)
+async def stats_get():
+    return JSONResponse(status_code=200, content=metrics.snapshot())
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_get():
+    body, content_type = metrics.exposition()
+    return Response(content=body, media_type=content_type)
+
+
+async def warm_up():
+    while True:
+        try:
+            await ping()
+            break
+        except (OSError, SQLAlchemyError):
+            logger.warning("Database is not reachable yet", exc_info=True)
+            await asyncio.sleep(1)
+
+    await render_executor.warm_up()
+    ticket_prerender.start(prerender_ticket)
+    ticket_gc.start()
+    if TICKET_PRERENDER_BACKFILL:
+        app.state.backfill = asyncio.create_task(backfill_tickets())
+    app.state.ready = True
+
+
+@app.on_event("startup")
+async def startup():
+    loop_lag_monitor.start()
+    await vk_client.start()
+    await user_cache.listen()
+    attempts_buffer.start(write_attempts)
+    static_assets.load(name.value for name in StaticFilesEnum)
+    render_executor.start()
+    # The worker serves requests right away; /health tells the load balancer
+    # when the database is reachable and the render pool is warm.
+    app.state.warm_up = asyncio.create_task(warm_up())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    app.state.ready = False
+    for name in ("warm_up", "backfill"):
+        task = getattr(app.state, name, None)
+        if task is not None:
+            task.cancel()
+    await ticket_prerender.stop()
+    await ticket_gc.stop()
+    await render_executor.drain(TICKET_DRAIN_TIMEOUT)
+    await attempts_buffer.stop()
+    await vk_client.close()
+    await user_cache.close()
+    await loop_lag_monitor.stop()
+    await engine.dispose()
+    metrics.mark_process_dead()
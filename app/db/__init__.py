@@ -1,2 +1,4 @@
 from .core import get_session
-from .core import UserDB
\ No newline at end of file
+from .core import request_session
+from .core import session_scope
+from .core import UserDB
@@ -0,0 +1,121 @@
+import os
+import asyncio
+import logging
+
+from .. import metrics
+
+ATTEMPTS_WRITE_BEHIND = os.getenv("ATTEMPTS_WRITE_BEHIND", "0") == "1"
+ATTEMPTS_FLUSH_MS = float(os.getenv("ATTEMPTS_FLUSH_MS", 500))
+ATTEMPTS_FLUSH_SIZE = int(os.getenv("ATTEMPTS_FLUSH_SIZE", 1000))
+
+logger = logging.getLogger(__name__)
+
+attempts_pending = metrics.Gauge(
+    "attempts_pending", "Attempt increments buffered and not yet written"
+)
+attempts_flushes = metrics.Counter(
+    "attempts_flushes", "Batched attempt writes sent to Postgres"
+)
+attempts_flush_failures = metrics.Counter(
+    "attempts_flush_failures", "Batched attempt writes that failed and were retried"
+)
+
+
+class AttemptsBuffer:
+    """Aggregates attempt increments per user and writes them in batches.
+
+    Increments are flushed every ``interval`` seconds or as soon as
+    ``max_pending`` of them are buffered, and once more on shutdown. The
+    writer is called with the batch and a callback to run right after its
+    commit.
+    """
+
+    def __init__(self, enabled: bool, interval: float, max_pending: int) -> None:
+        self.enabled = enabled
+        self.interval = interval
+        self.max_pending = max(1, max_pending)
+        self._pending: dict[int, int] = {}
+        self._flushing: dict[int, int] = {}
+        self._count = 0
+        self._write = None
+        self._task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+
+    def start(self, write) -> None:
+        if self.enabled and self._task is None:
+            self._write = write
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.flush()
+
+    def add(self, vk_user_id: int, amount: int = 1) -> None:
+        self._pending[vk_user_id] = self._pending.get(vk_user_id, 0) + amount
+        self._count += amount
+        attempts_pending.set(self._count)
+        if self._count >= self.max_pending:
+            self._wakeup.set()
+
+    def pending(self, vk_user_id: int) -> int:
+        """Increments of ``vk_user_id`` not yet visible in Postgres.
+
+        Only this worker's: with several workers, increments buffered by
+        the others show up once they are flushed.
+        """
+        return self._pending.get(vk_user_id, 0) + self._flushing.get(vk_user_id, 0)
+
+    async def flush(self) -> None:
+        async with self._lock:
+            if not self._pending:
+                return
+
+            batch, self._pending = self._pending, {}
+            self._flushing = batch
+            self._count = 0
+            try:
+                await self._write(batch, self._committed)
+                attempts_flushes.inc()
+            except BaseException:
+                # Put back unless the writer got as far as its commit.
+                if self._flushing is batch:
+                    attempts_flush_failures.inc()
+                    for vk_user_id, amount in batch.items():
+                        self._pending[vk_user_id] = (
+                            self._pending.get(vk_user_id, 0) + amount
+                        )
+                        self._count += amount
+                raise
+            finally:
+                self._flushing = {}
+                attempts_pending.set(self._count)
+
+    def _committed(self) -> None:
+        # Called by the writer as soon as its commit returns, before any other
+        # await: until then pending() counts the batch, from then on Postgres
+        # does, and a read in between would count it twice.
+        self._flushing = {}
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self.flush()
+            except Exception:
+                logger.warning("Failed to write buffered attempts", exc_info=True)
+
+
+attempts_buffer = AttemptsBuffer(
+    ATTEMPTS_WRITE_BEHIND, ATTEMPTS_FLUSH_MS / 1000, ATTEMPTS_FLUSH_SIZE
+)
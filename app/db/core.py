@@ -1,16 +1,154 @@
 import os
+import re
+import time
+import asyncio
 
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+from sqlalchemy import event
+from sqlalchemy import make_url
+from sqlalchemy import BigInteger
 from sqlalchemy import Integer
 from sqlalchemy import String
 from sqlalchemy import Boolean
+from sqlalchemy import false
+from sqlalchemy import text
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncConnection, AsyncSession
+
+from .. import metrics
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 SQLALCHEMY_DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://")
-engine = create_async_engine(SQLALCHEMY_DATABASE_URL)
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100))
+DB_QUERY_CACHE_SIZE = int(os.getenv("DB_QUERY_CACHE_SIZE", 500))
+
+engine = create_async_engine(
+    make_url(SQLALCHEMY_DATABASE_URL).update_query_dict(
+        {"prepared_statement_cache_size": str(DB_STATEMENT_CACHE_SIZE)}
+    ),
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    query_cache_size=DB_QUERY_CACHE_SIZE,
+)
+
+pool_checkout_seconds = metrics.Histogram(
+    "db_pool_checkout_seconds", "Time spent waiting for a pooled connection"
+)
+pool_checked_out = metrics.Gauge(
+    "db_pool_checked_out", "Connections currently checked out of the pool"
+)
+pool_saturation = metrics.Gauge(
+    "db_pool_saturation",
+    "Checked out connections over pool_size + max_overflow",
+    multiprocess_mode="max",
+)
+query_seconds = metrics.Histogram(
+    "db_query_duration_seconds",
+    "Statement execution time by statement kind and table",
+    labelnames=("statement",),
+)
+query_errors = metrics.Counter(
+    "db_query_errors",
+    "Failed statements by statement kind and table",
+    labelnames=("statement",),
+)
+
+
+@event.listens_for(engine.sync_engine, "checkout")
+def _pool_checkout(dbapi_connection, connection_record, connection_proxy):
+    pool_checked_out.inc()
+    pool_saturation.set(pool_checked_out.value / (DB_POOL_SIZE + DB_MAX_OVERFLOW))
+
+
+@event.listens_for(engine.sync_engine, "checkin")
+def _pool_checkin(dbapi_connection, connection_record):
+    pool_checked_out.dec()
+    pool_saturation.set(pool_checked_out.value / (DB_POOL_SIZE + DB_MAX_OVERFLOW))
+
+
+_statement_target = re.compile(
+    r'^\s*(?:insert\s+into|update|delete\s+from)\s+"?(\w+)', re.IGNORECASE
+)
+_statement_source = re.compile(r'\bfrom\s+"?(\w+)', re.IGNORECASE)
+
+
+@lru_cache(maxsize=512)
+def statement_label(statement: str) -> str:
+    # Statements are parameterized, so there are few distinct texts; the
+    # label is the operation and the main table, e.g. "update users".
+    words = statement.split(None, 1)
+    operation = words[0].lower() if words else "other"
+    if operation not in ("select", "insert", "update", "delete", "with"):
+        return "other"
+
+    match = _statement_target.match(statement) or _statement_source.search(
+        statement
+    )
+    return f"{operation} {match.group(1)}" if match is not None else operation
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _query_started(connection, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _query_finished(connection, cursor, statement, parameters, context, executemany):
+    query_seconds.labels(statement_label(statement)).observe(
+        time.perf_counter() - context._query_started
+    )
+
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _query_failed(exception_context):
+    if exception_context.statement is not None:
+        query_errors.labels(statement_label(exception_context.statement)).inc()
+
+
+async def ping() -> None:
+    async with engine.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+
+
+@asynccontextmanager
+async def advisory_lock(key: int):
+    """Yields whether this process got the session level advisory lock
+    `key`; no other process gets it until the block ends."""
+    async with engine.connect() as connection:
+        result = await connection.execute(
+            text("SELECT pg_try_advisory_lock(:key)"), {"key": key}
+        )
+        locked = result.scalar()
+        # The lock outlives the transaction, the connection is not left
+        # idle in one.
+        await connection.commit()
+        try:
+            yield locked
+        finally:
+            if locked:
+                try:
+                    await connection.execute(
+                        text("SELECT pg_advisory_unlock(:key)"), {"key": key}
+                    )
+                    await connection.commit()
+                except BaseException:
+                    # Closed rather than pooled, so the lock goes with it.
+                    await connection.invalidate()
+                    raise
 
 
 async def get_session() -> AsyncSession:
@@ -18,6 +156,89 @@ async def get_session() -> AsyncSession:
     return async_session
 
 
+async def _connected_session() -> AsyncSession:
+    session = await get_session()
+    started = time.perf_counter()
+    await session.connection()
+    pool_checkout_seconds.observe(time.perf_counter() - started)
+    return session
+
+
+class RequestSession:
+    """Session shared by the queries of one request, opened on first use.
+
+    The connection is only held while a session_scope() block runs, nested
+    blocks included. Between blocks a request can wait on a ticket render
+    or on VK for a long time, and a connection kept meanwhile, idle in its
+    transaction, would starve the pool.
+    """
+
+    def __init__(self) -> None:
+        self.task = asyncio.current_task()
+        self.connection: AsyncConnection | None = None
+        self.session: AsyncSession | None = None
+        self.depth = 0
+        self.closed = False
+
+    async def get(self) -> AsyncSession:
+        if self.session is None:
+            started = time.perf_counter()
+            self.connection = await engine.connect()
+            pool_checkout_seconds.observe(time.perf_counter() - started)
+            self.session = AsyncSession(bind=self.connection, expire_on_commit=False)
+        return self.session
+
+    async def release(self) -> None:
+        # Closing rolls back whatever the block left uncommitted, reads
+        # included, and returns the connection to the pool.
+        if self.session is not None:
+            session, connection = self.session, self.connection
+            self.session = self.connection = None
+            await session.close()
+            await connection.close()
+
+    async def close(self) -> None:
+        self.closed = True
+        await self.release()
+
+
+_request_session: ContextVar[RequestSession | None] = ContextVar(
+    "request_session", default=None
+)
+
+
+async def request_session():
+    holder = RequestSession()
+    _request_session.set(holder)
+    try:
+        yield holder
+    finally:
+        await holder.close()
+
+
+@asynccontextmanager
+async def session_scope():
+    holder = _request_session.get()
+    # Background tasks inherit the request context, but must not share its
+    # session: only the task that opened the request uses it.
+    if holder is None or holder.closed or holder.task is not asyncio.current_task():
+        async with await _connected_session() as session:
+            yield session
+        return
+
+    session = await holder.get()
+    holder.depth += 1
+    try:
+        yield session
+    except BaseException:
+        await session.rollback()
+        raise
+    finally:
+        holder.depth -= 1
+        if holder.depth == 0:
+            await holder.release()
+
+
 class Base(DeclarativeBase):
     pass
 
@@ -26,12 +247,42 @@ class UserDB(Base):
     __tablename__ = "users"
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    user_id: Mapped[int] = mapped_column(Integer, index=True)
+    user_id: Mapped[int] = mapped_column(Integer, index=True, unique=True)
     onboarding: Mapped[bool] = mapped_column(Boolean, default=False)
     is_test_passed: Mapped[bool] = mapped_column(Boolean, default=False)
     attempts: Mapped[int] = mapped_column(Integer, index=True, default=0)
     first_name: Mapped[str] = mapped_column(String(128))
     last_name: Mapped[str] = mapped_column(String(128))
+    names_pending: Mapped[bool] = mapped_column(
+        Boolean, default=False, server_default=false()
+    )
 
     def __repr__(self) -> str:
         return "User(id={self.id!r}"
+
+
+class GameStatsDB(Base):
+    """Running totals over users, split in shards so that concurrent
+    updates rarely wait for the same row; readers sum every shard.
+
+    Triggers on users keep them up to date in the transaction of every
+    change, see the game_stats_counters migration.
+    """
+
+    __tablename__ = "game_stats"
+
+    shard: Mapped[int] = mapped_column(Integer, primary_key=True)
+    players: Mapped[int] = mapped_column(BigInteger, default=0)
+    onboarded: Mapped[int] = mapped_column(BigInteger, default=0)
+    passed: Mapped[int] = mapped_column(BigInteger, default=0)
+    attempts: Mapped[int] = mapped_column(BigInteger, default=0)
+
+
+class AttemptsHistogramDB(Base):
+    """Players by attempts made, sharded like game_stats."""
+
+    __tablename__ = "attempts_histogram"
+
+    shard: Mapped[int] = mapped_column(Integer, primary_key=True)
+    attempts: Mapped[int] = mapped_column(Integer, primary_key=True)
+    players: Mapped[int] = mapped_column(BigInteger, default=0)
@@ -1,13 +1,164 @@
-import aiohttp
 import os
+import time
+import asyncio
+
+import aiohttp
+
+from .. import metrics
 
 VK_SERVICE = os.getenv("VK_SERVICE")
+VK_API_URL = os.getenv("VK_API_URL", "https://api.vk.com/method")
+VK_API_VERSION = "5.131"
+VK_POOL_LIMIT = int(os.getenv("VK_POOL_LIMIT", 100))
+VK_CONNECT_TIMEOUT = float(os.getenv("VK_CONNECT_TIMEOUT", 2))
+VK_READ_TIMEOUT = float(os.getenv("VK_READ_TIMEOUT", 5))
+VK_BATCH_WINDOW_MS = float(os.getenv("VK_BATCH_WINDOW_MS", 20))
+VK_BATCH_SIZE = min(int(os.getenv("VK_BATCH_SIZE", 100)), 1000)
+
+batch_sizes = metrics.Histogram(
+    "vk_users_get_batch_size",
+    "User ids sent in one batched users.get call",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+batch_seconds = metrics.Histogram(
+    "vk_users_get_batch_seconds", "Duration of one batched users.get call"
+)
+lookup_seconds = metrics.Histogram(
+    "vk_names_lookup_seconds", "Time a caller waited for names, batching included"
+)
+call_seconds = metrics.Histogram(
+    "vk_api_call_duration_seconds", "VK API call latency", labelnames=("method",)
+)
+call_errors = metrics.Counter(
+    "vk_api_call_errors", "Failed VK API calls", labelnames=("method", "reason")
+)
+
+
+class VkApiError(Exception):
+    pass
+
+
+class VkClient:
+    def __init__(self) -> None:
+        self._session: aiohttp.ClientSession | None = None
+
+    async def start(self) -> None:
+        if self._session is not None:
+            return
+
+        connector = aiohttp.TCPConnector(
+            limit=VK_POOL_LIMIT, ttl_dns_cache=300, keepalive_timeout=30
+        )
+        timeout = aiohttp.ClientTimeout(
+            connect=VK_CONNECT_TIMEOUT, sock_read=VK_READ_TIMEOUT
+        )
+        self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def call(self, method: str, **params):
+        await self.start()
+        params.update(access_token=VK_SERVICE, v=VK_API_VERSION)
+        started = time.perf_counter()
+        try:
+            async with self._session.get(
+                f"{VK_API_URL}/{method}", params=params
+            ) as response:
+                data = await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as exc:
+            call_errors.labels(method, type(exc).__name__).inc()
+            raise VkApiError(f"{method}: {exc!r}") from exc
+        finally:
+            call_seconds.labels(method).observe(time.perf_counter() - started)
+
+        if not isinstance(data, dict) or "response" not in data:
+            call_errors.labels(method, "api_error").inc()
+            raise VkApiError(f"{method}: {data!r}")
+        return data["response"]
+
+
+vk_client = VkClient()
+
+
+class VkNamesBatcher:
+    """Coalesces name lookups into one users.get call per window or batch."""
+
+    def __init__(self, client: VkClient, window: float, max_size: int) -> None:
+        self.client = client
+        self.window = window
+        self.max_size = max(1, max_size)
+        self._pending: dict[int, list[asyncio.Future]] = {}
+        self._timer: asyncio.TimerHandle | None = None
+        self._requests: set[asyncio.Task] = set()
+
+    async def get(self, vk_user_id: int) -> tuple[str, str]:
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        future = loop.create_future()
+        self._pending.setdefault(vk_user_id, []).append(future)
+
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        try:
+            return await future
+        finally:
+            lookup_seconds.observe(time.perf_counter() - started)
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, {}
+        if batch:
+            task = asyncio.create_task(self._request(batch))
+            self._requests.add(task)
+            task.add_done_callback(self._requests.discard)
+
+    async def _request(self, batch: dict[int, list[asyncio.Future]]) -> None:
+        batch_sizes.observe(len(batch))
+        started = time.perf_counter()
+        try:
+            users = await self.client.call(
+                "users.get",
+                user_ids=",".join(map(str, batch)),
+                fields="first_name,last_name",
+                lang="ru",
+            )
+            names = {
+                user["id"]: (user["first_name"], user["last_name"]) for user in users
+            }
+        except Exception as exc:
+            # Whatever went wrong, including a reply of an unexpected shape,
+            # every caller of the batch gets the error instead of waiting.
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(exc)
+            return
+        finally:
+            batch_seconds.observe(time.perf_counter() - started)
+
+        for vk_user_id, futures in batch.items():
+            for future in futures:
+                if future.done():
+                    continue
+                if vk_user_id in names:
+                    future.set_result(names[vk_user_id])
+                else:
+                    future.set_exception(
+                        VkApiError(f"users.get: no user {vk_user_id}")
+                    )
+
+
+vk_names_batcher = VkNamesBatcher(vk_client, VK_BATCH_WINDOW_MS / 1000, VK_BATCH_SIZE)
 
 
-async def vk_get_names(vk_user_id: int):
-    url = f"https://api.vk.com/method/users.get?user_ids={vk_user_id}&fields=first_name,last_name&access_token={VK_SERVICE}&v=5.131&lang=ru"
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            data = await response.json()
-            user_info = data["response"][0]
-            return user_info["first_name"], user_info["last_name"]
+async def vk_get_names(vk_user_id: int) -> tuple[str, str]:
+    return await vk_names_batcher.get(vk_user_id)
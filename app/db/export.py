@@ -0,0 +1,85 @@
+import io
+import os
+import csv
+
+import orjson
+
+from sqlalchemy import select
+
+from .core import UserDB
+from .core import engine
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", 5000))
+
+EXPORT_COLUMNS = (
+    "user_id",
+    "onboarding",
+    "is_test_passed",
+    "attempts",
+    "first_name",
+    "last_name",
+)
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+# Spreadsheets take text starting with these for a formula, and the names
+# come from VK, so from the users themselves.
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+async def iter_user_chunks(
+    is_test_passed: bool | None = None,
+    onboarding: bool | None = None,
+    chunk_rows: int = EXPORT_CHUNK_ROWS,
+):
+    """Lists of user rows, read through a server-side cursor chunk by chunk,
+    so memory does not grow with the table."""
+    statement = select(*(getattr(UserDB, name) for name in EXPORT_COLUMNS))
+    if is_test_passed is not None:
+        statement = statement.where(UserDB.is_test_passed.is_(is_test_passed))
+    if onboarding is not None:
+        statement = statement.where(UserDB.onboarding.is_(onboarding))
+    statement = statement.order_by(UserDB.id)
+
+    # A connection of its own: the cursor lives as long as the export.
+    async with engine.connect() as connection:
+        result = await connection.stream(
+            statement.execution_options(yield_per=chunk_rows)
+        )
+        async for rows in result.partitions(chunk_rows):
+            yield rows
+
+
+def escape_cell(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def encode_csv(rows: list, header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows(map(escape_cell, row) for row in rows)
+    return buffer.getvalue().encode()
+
+
+def encode_ndjson(rows: list) -> bytes:
+    return b"".join(
+        orjson.dumps(dict(zip(EXPORT_COLUMNS, row)), option=orjson.OPT_APPEND_NEWLINE)
+        for row in rows
+    )
+
+
+async def export_users(fmt: str, **filters):
+    """Encoded chunks of the users export in `fmt`, one per cursor chunk."""
+    header = True
+    async for rows in iter_user_chunks(**filters):
+        if fmt == "csv":
+            yield encode_csv(rows, header)
+            header = False
+        else:
+            yield encode_ndjson(rows)
+
+    # An empty CSV export still gets its header.
+    if fmt == "csv" and header:
+        yield encode_csv([], header)
@@ -0,0 +1,147 @@
+from sqlalchemy import event
+from sqlalchemy import func
+from sqlalchemy import select
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .core import AttemptsHistogramDB
+from .core import Base
+from .core import GameStatsDB
+
+# Counter rows are spread over this many shards by user_id. Readers sum every
+# shard, so changing it only takes replacing the trigger functions.
+GAME_STATS_SHARDS = 16
+# The last bucket of the distribution holds everyone with at least this many.
+ATTEMPTS_BUCKETS = 20
+
+TOTALS = ("players", "onboarded", "passed", "attempts")
+
+# The triggers on users that keep the counters, created by the
+# game_stats_counters migration and by Base.metadata.create_all; the only
+# copy of their SQL. Statement level triggers see every row a
+# statement changed at once, so a batch of attempt writes updates each
+# counter row once, and in shard order, which keeps concurrent transactions
+# from deadlocking on them.
+_INSERT_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION game_stats_users_insert() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO game_stats AS s (shard, players, onboarded, passed, attempts)
+    SELECT user_id % {GAME_STATS_SHARDS},
+           count(*),
+           count(*) FILTER (WHERE onboarding),
+           count(*) FILTER (WHERE is_test_passed),
+           coalesce(sum(attempts), 0)
+    FROM new_users
+    GROUP BY 1
+    ORDER BY 1
+    ON CONFLICT (shard) DO UPDATE SET
+        players = s.players + excluded.players,
+        onboarded = s.onboarded + excluded.onboarded,
+        passed = s.passed + excluded.passed,
+        attempts = s.attempts + excluded.attempts;
+
+    INSERT INTO attempts_histogram AS h (shard, attempts, players)
+    SELECT user_id % {GAME_STATS_SHARDS}, least(attempts, {ATTEMPTS_BUCKETS}), count(*)
+    FROM new_users
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+    ON CONFLICT (shard, attempts) DO UPDATE SET
+        players = h.players + excluded.players;
+    RETURN NULL;
+END
+$$
+"""
+_UPDATE_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION game_stats_users_update() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO game_stats AS s (shard, players, onboarded, passed, attempts)
+    SELECT shard, 0, sum(onboarded), sum(passed), sum(attempts)
+    FROM (
+        SELECT n.user_id % {GAME_STATS_SHARDS} AS shard,
+               n.onboarding::int - o.onboarding::int AS onboarded,
+               n.is_test_passed::int - o.is_test_passed::int AS passed,
+               n.attempts - o.attempts AS attempts
+        FROM new_users AS n JOIN old_users AS o USING (id)
+    ) AS changes
+    GROUP BY 1
+    HAVING sum(onboarded) <> 0 OR sum(passed) <> 0 OR sum(attempts) <> 0
+    ORDER BY 1
+    ON CONFLICT (shard) DO UPDATE SET
+        onboarded = s.onboarded + excluded.onboarded,
+        passed = s.passed + excluded.passed,
+        attempts = s.attempts + excluded.attempts;
+
+    INSERT INTO attempts_histogram AS h (shard, attempts, players)
+    SELECT shard, bucket, sum(players)
+    FROM (
+        SELECT n.user_id % {GAME_STATS_SHARDS} AS shard,
+               least(n.attempts, {ATTEMPTS_BUCKETS}) AS bucket,
+               1 AS players
+        FROM new_users AS n JOIN old_users AS o USING (id)
+        WHERE least(n.attempts, {ATTEMPTS_BUCKETS})
+              <> least(o.attempts, {ATTEMPTS_BUCKETS})
+        UNION ALL
+        SELECT o.user_id % {GAME_STATS_SHARDS},
+               least(o.attempts, {ATTEMPTS_BUCKETS}),
+               -1
+        FROM new_users AS n JOIN old_users AS o USING (id)
+        WHERE least(n.attempts, {ATTEMPTS_BUCKETS})
+              <> least(o.attempts, {ATTEMPTS_BUCKETS})
+    ) AS moves
+    GROUP BY 1, 2
+    HAVING sum(players) <> 0
+    ORDER BY 1, 2
+    ON CONFLICT (shard, attempts) DO UPDATE SET
+        players = h.players + excluded.players;
+    RETURN NULL;
+END
+$$
+"""
+TRIGGER_DDL = (
+    _INSERT_FUNCTION,
+    _UPDATE_FUNCTION,
+    """
+    CREATE OR REPLACE TRIGGER game_stats_insert AFTER INSERT ON users
+    REFERENCING NEW TABLE AS new_users
+    FOR EACH STATEMENT EXECUTE FUNCTION game_stats_users_insert()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER game_stats_update AFTER UPDATE ON users
+    REFERENCING OLD TABLE AS old_users NEW TABLE AS new_users
+    FOR EACH STATEMENT EXECUTE FUNCTION game_stats_users_update()
+    """,
+)
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_triggers(metadata, connection, **kw):
+    # For databases made with Base.metadata.create_all instead of the
+    # migrations, like the benchmark ones.
+    for statement in TRIGGER_DDL:
+        connection.execute(text(statement))
+
+
+async def read_stats(session: AsyncSession) -> dict:
+    # Both tables hold a few rows per shard, whatever the number of users.
+    sums = [func.coalesce(func.sum(getattr(GameStatsDB, name)), 0) for name in TOTALS]
+    result = await session.execute(select(*sums))
+    stats = dict(zip(TOTALS, (int(value) for value in result.one())))
+
+    result = await session.execute(
+        select(AttemptsHistogramDB.attempts, func.sum(AttemptsHistogramDB.players))
+        .group_by(AttemptsHistogramDB.attempts)
+        .order_by(AttemptsHistogramDB.attempts)
+    )
+    distribution = {}
+    for attempts, players in result:
+        if players:
+            label = f"{attempts}+" if attempts == ATTEMPTS_BUCKETS else str(attempts)
+            distribution[label] = int(players)
+
+    players = stats["players"]
+    stats["onboarding_rate"] = stats["onboarded"] / players if players else 0.0
+    stats["pass_rate"] = stats["passed"] / players if players else 0.0
+    stats["attempts_distribution"] = distribution
+    return stats
@@ -0,0 +1,151 @@
+import os
+import asyncio
+import logging
+
+import asyncpg
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import metrics
+from ..lru import TTLCache
+
+from .core import DATABASE_URL
+from .core import UserDB
+
+USER_CACHE_ENABLED = os.getenv("USER_CACHE_ENABLED", "1") == "1"
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 50000))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 10))
+USER_CACHE_NOTIFY = os.getenv("USER_CACHE_NOTIFY", "0") == "1"
+
+NOTIFY_CHANNEL = "users_cache"
+# The listening connection is checked this often, and reconnected after
+# waiting twice as long each time up to the maximum.
+LISTEN_CHECK_INTERVAL = 5
+LISTEN_RETRY_MIN = 1
+LISTEN_RETRY_MAX = 30
+COLUMNS = UserDB.__table__.columns
+
+notify_users = text(
+    "SELECT pg_notify(:channel, :token || ':' || id) "
+    "FROM unnest(CAST(:ids AS integer[])) AS id"
+)
+
+logger = logging.getLogger(__name__)
+
+user_cache_hits = metrics.Counter("user_cache_hits", "User reads served from memory")
+user_cache_misses = metrics.Counter(
+    "user_cache_misses", "User reads that went to Postgres"
+)
+user_cache_hit_ratio = metrics.Gauge(
+    "user_cache_hit_ratio",
+    "Share of user reads served from memory",
+    multiprocess_mode="all",
+)
+user_cache_invalidations = metrics.Counter(
+    "user_cache_invalidations", "Entries evicted by notifications from other workers"
+)
+
+
+class UserCache:
+    def __init__(self, enabled: bool, maxsize: int, ttl: float, notify: bool) -> None:
+        self.enabled = enabled
+        self.notify = enabled and notify
+        self._entries = TTLCache(maxsize, ttl)
+        self._listener: asyncio.Task | None = None
+        self._token = str(os.getpid())
+
+    def get(self, vk_user_id: int) -> UserDB | None:
+        if not self.enabled:
+            return None
+
+        db_user = self._entries.get(vk_user_id)
+        if db_user is None:
+            user_cache_misses.inc()
+        else:
+            user_cache_hits.inc()
+
+        lookups = user_cache_hits.value + user_cache_misses.value
+        user_cache_hit_ratio.set(user_cache_hits.value / lookups)
+        return db_user
+
+    def put(self, db_user: UserDB) -> None:
+        if not self.enabled:
+            return
+
+        # Keep a transient copy: the loaded instance may still belong to a
+        # live request session.
+        snapshot = UserDB(
+            **{column.key: getattr(db_user, column.key) for column in COLUMNS}
+        )
+        self._entries.set(db_user.user_id, snapshot)
+
+    def evict(self, vk_user_id: int) -> None:
+        self._entries.pop(vk_user_id)
+
+    async def publish(self, session: AsyncSession, *vk_user_ids: int) -> None:
+        """Tell the other workers to drop ``vk_user_ids``. Runs in the caller's
+        transaction, so the notifications are only delivered on commit."""
+        if self.notify and vk_user_ids:
+            await session.execute(
+                notify_users,
+                {
+                    "channel": NOTIFY_CHANNEL,
+                    "token": self._token,
+                    "ids": list(vk_user_ids),
+                },
+            )
+
+    async def listen(self) -> None:
+        if self.notify and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+
+    async def _listen(self) -> None:
+        delay = LISTEN_RETRY_MIN
+        while True:
+            try:
+                connection = await asyncpg.connect(DATABASE_URL)
+                try:
+                    await connection.add_listener(NOTIFY_CHANNEL, self._on_notify)
+                    # Invalidations sent while nobody listened are lost.
+                    self._entries.clear()
+                    delay = LISTEN_RETRY_MIN
+                    while True:
+                        await asyncio.sleep(LISTEN_CHECK_INTERVAL)
+                        # A dropped connection only shows when it is used.
+                        await connection.execute(
+                            "SELECT 1", timeout=LISTEN_CHECK_INTERVAL
+                        )
+                finally:
+                    connection.terminate()
+            except Exception:
+                logger.warning(
+                    "Not listening for user cache invalidations, retrying in %s s",
+                    delay,
+                    exc_info=True,
+                )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, LISTEN_RETRY_MAX)
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str) -> None:
+        token, _, vk_user_id = payload.partition(":")
+        if token == self._token:
+            return
+
+        try:
+            self.evict(int(vk_user_id))
+        except ValueError:
+            logger.warning("Unexpected %s payload: %r", channel, payload)
+            return
+        user_cache_invalidations.inc()
+
+
+user_cache = UserCache(
+    USER_CACHE_ENABLED, USER_CACHE_SIZE, USER_CACHE_TTL, USER_CACHE_NOTIFY
+)
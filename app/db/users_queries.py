@@ -1,95 +1,222 @@
+import asyncio
+import logging
+
+from sqlalchemy import Integer
+from sqlalchemy import bindparam
+from sqlalchemy import column
 from sqlalchemy import select
 from sqlalchemy import update
+from sqlalchemy import values
+from sqlalchemy.dialects.postgresql import insert
 
 from .core import get_session
+from .core import session_scope
 from .core import UserDB
+from .attempts_buffer import attempts_buffer
 from .dependencies import vk_get_names
+from .game_stats import read_stats
+from .user_cache import user_cache
+
+logger = logging.getLogger(__name__)
+
+_names_requests: dict[int, asyncio.Task] = {}
+
+# Built once so SQLAlchemy reuses the compiled form from its statement cache.
+select_user = select(UserDB).where(UserDB.user_id == bindparam("vk_user_id"))
 
 
 async def get_or_create_user(vk_user_id: int) -> UserDB:
-    async with await get_session() as session:
-        result = await session.execute(
-            select(UserDB).where(UserDB.user_id == vk_user_id)
-        )
+    db_user = user_cache.get(vk_user_id)
+    if db_user is not None:
+        if db_user.names_pending:
+            request_names(vk_user_id)
+        return db_user
+
+    async with session_scope() as session:
+        result = await session.execute(select_user, {"vk_user_id": vk_user_id})
         db_user = result.scalar()
 
-        if db_user:
-            return db_user
+        if db_user is None:
+            # Names are filled in by a background VK lookup, so the row is
+            # created right away and concurrent first requests cannot
+            # insert duplicates.
+            result = await session.execute(
+                insert(UserDB)
+                .values(
+                    user_id=vk_user_id,
+                    first_name="",
+                    last_name="",
+                    names_pending=True,
+                )
+                .on_conflict_do_nothing(index_elements=[UserDB.user_id])
+                .returning(UserDB)
+            )
+            db_user = result.scalar()
+            await session.commit()
+
+        if db_user is None:
+            result = await session.execute(select_user, {"vk_user_id": vk_user_id})
+            db_user = result.scalar_one()
+
+        user_cache.put(db_user)
+        if db_user.names_pending:
+            request_names(vk_user_id)
+        return db_user
+
+
+def request_names(vk_user_id: int) -> asyncio.Task:
+    task = _names_requests.get(vk_user_id)
+    if task is None:
+        task = asyncio.create_task(_store_names(vk_user_id))
+        _names_requests[vk_user_id] = task
+        task.add_done_callback(lambda task: _names_stored(vk_user_id, task))
+    return task
+
 
-        first_name, last_name = await vk_get_names(vk_user_id)
-        new_user = UserDB(
-            user_id=vk_user_id, first_name=first_name, last_name=last_name
+def _names_stored(vk_user_id: int, task: asyncio.Task) -> None:
+    del _names_requests[vk_user_id]
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(
+            "Failed to fetch VK names for %s", vk_user_id, exc_info=task.exception()
         )
-        session.add(new_user)
-        await session.commit()
-        return new_user
 
 
-async def set_onboarding_true(vk_user_id: int) -> bool:
-    async with await get_session() as session:
-        query = select(UserDB).where(UserDB.user_id == vk_user_id)
-        result = await session.execute(query)
+async def _store_names(vk_user_id: int) -> tuple[str, str]:
+    first_name, last_name = await vk_get_names(vk_user_id)
+    await _update_user(
+        vk_user_id, first_name=first_name, last_name=last_name, names_pending=False
+    )
+    return first_name, last_name
+
+
+async def get_names(db_user: UserDB) -> tuple[str, str]:
+    if not db_user.names_pending:
+        return db_user.first_name, db_user.last_name
+    return await asyncio.shield(request_names(db_user.user_id))
+
+
+async def _update_user(vk_user_id: int, **values) -> bool:
+    async with session_scope() as session:
+        result = await session.execute(
+            update(UserDB)
+            .where(UserDB.user_id == vk_user_id)
+            .values(**values)
+            .returning(UserDB)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
         db_user = result.scalar()
+        if db_user is not None:
+            await user_cache.publish(session, vk_user_id)
+        await session.commit()
 
-        if db_user:
-            update_stmt = (
-                update(UserDB)
-                .where(UserDB.user_id == vk_user_id)
-                .values(onboarding=True)
-            )
-            await session.execute(update_stmt)
-            await session.commit()
-            return True
+        if db_user is None:
+            user_cache.evict(vk_user_id)
+            return False
+
+        user_cache.put(db_user)
+        return True
 
-        return False
+
+async def set_onboarding_true(vk_user_id: int) -> bool:
+    return await _update_user(vk_user_id, onboarding=True)
 
 
 async def set_test_passed(vk_user_id: int) -> bool:
-    async with await get_session() as session:
-        query = select(UserDB).where(UserDB.user_id == vk_user_id)
-        result = await session.execute(query)
+    return await _update_user(vk_user_id, is_test_passed=True)
+
+
+async def check_finished(vk_user_id: int) -> bool:
+    # is_test_passed never goes back to false, so only a positive cached
+    # answer can be trusted without asking Postgres.
+    db_user = user_cache.get(vk_user_id)
+    if db_user is not None and db_user.is_test_passed:
+        return True
+
+    async with session_scope() as session:
+        result = await session.execute(select_user, {"vk_user_id": vk_user_id})
         db_user = result.scalar()
 
-        if db_user:
-            update_stmt = (
-                update(UserDB)
-                .where(UserDB.user_id == vk_user_id)
-                .values(is_test_passed=True)
-            )
-            await session.execute(update_stmt)
-            await session.commit()
-            return True
+        if db_user is None:
+            return False
 
-        return False
+        user_cache.put(db_user)
+        return db_user.is_test_passed
 
 
-async def check_finished(vk_user_id: int) -> bool:
+async def iter_passed_user_ids():
     async with await get_session() as session:
-        query = select(UserDB).where(UserDB.user_id == vk_user_id)
-        result = await session.execute(query)
+        result = await session.stream_scalars(
+            select(UserDB.user_id).where(UserDB.is_test_passed.is_(True))
+        )
+        async for vk_user_id in result:
+            yield vk_user_id
+
+
+async def user_exists(vk_user_id: int) -> bool:
+    if user_cache.get(vk_user_id) is not None:
+        return True
+
+    async with session_scope() as session:
+        result = await session.execute(select_user, {"vk_user_id": vk_user_id})
         db_user = result.scalar()
 
-        if db_user and db_user.is_test_passed:
-            return True
+        if db_user is None:
+            return False
 
-        return False
+        user_cache.put(db_user)
+        return True
 
 
 async def update_attempts_count(vk_user_id: int) -> bool:
-    async with await get_session() as session:
-        query = select(UserDB).where(UserDB.user_id == vk_user_id)
-        result = await session.execute(query)
-        db_user = result.scalar()
+    if attempts_buffer.enabled:
+        if not await user_exists(vk_user_id):
+            return False
+        attempts_buffer.add(vk_user_id)
+        return True
+
+    return await _update_user(vk_user_id, attempts=UserDB.attempts + 1)
+
+
+async def record_attempt(vk_user_id: int, passed: bool) -> bool:
+    if attempts_buffer.enabled:
+        if passed:
+            found = await _update_user(vk_user_id, is_test_passed=True)
+        else:
+            found = await user_exists(vk_user_id)
+        if found:
+            attempts_buffer.add(vk_user_id)
+        return found
+
+    values = {"attempts": UserDB.attempts + 1}
+    if passed:
+        values["is_test_passed"] = True
+    return await _update_user(vk_user_id, **values)
+
+
+async def write_attempts(deltas: dict[int, int], committed) -> None:
+    rows = values(
+        column("user_id", Integer), column("delta", Integer), name="deltas"
+    ).data(list(deltas.items()))
+
+    async with session_scope() as session:
+        result = await session.execute(
+            update(UserDB)
+            .where(UserDB.user_id == rows.c.user_id)
+            .values(attempts=UserDB.attempts + rows.c.delta)
+            .returning(UserDB)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
+        db_users = result.scalars().all()
+        await user_cache.publish(session, *(db_user.user_id for db_user in db_users))
+        await session.commit()
+
+        # No await from the commit to here: the buffer stops counting the
+        # batch and the cache gets the new values at the same moment.
+        committed()
+        for db_user in db_users:
+            user_cache.put(db_user)
 
-        if db_user:
-            count = db_user.attempts + 1
-            update_stmt = (
-                update(UserDB)
-                .where(UserDB.user_id == vk_user_id)
-                .values(attempts=count)
-            )
-            await session.execute(update_stmt)
-            await session.commit()
-            return True
 
-        return False
+async def get_game_stats() -> dict:
+    async with session_scope() as session:
+        return await read_stats(session)
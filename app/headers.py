@@ -0,0 +1,19 @@
+def accepted(header: str | None) -> set[str]:
+    """Lower-cased values of an Accept-style header that have a non-zero q."""
+    values = set()
+    if not header:
+        return values
+
+    for item in header.split(","):
+        value, _, params = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, number = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(number)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            values.add(value.strip().lower())
+    return values
@@ -0,0 +1,47 @@
+import os
+import time
+import asyncio
+
+from . import metrics
+
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", 0.5))
+
+loop_lag_seconds = metrics.Histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop woke up a sleeping task",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+loop_lag_last = metrics.Gauge(
+    "event_loop_lag_last_seconds",
+    "Latest event loop lag sample",
+    multiprocess_mode="max",
+)
+
+
+class LoopLagMonitor:
+    """Sleeps for a fixed interval and records how much later it woke up."""
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(time.perf_counter() - started - self.interval, 0.0)
+            loop_lag_seconds.observe(lag)
+            loop_lag_last.set(lag)
+
+
+loop_lag_monitor = LoopLagMonitor(LOOP_LAG_INTERVAL)
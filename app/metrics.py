@@ -0,0 +1,165 @@
+import os
+import copy
+import bisect
+import logging
+
+logger = logging.getLogger(__name__)
+
+# With several uvicorn workers every process writes its samples to files in
+# this directory and /metrics merges them, whichever worker serves the scrape.
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+if PROMETHEUS_MULTIPROC_DIR and not os.path.isdir(PROMETHEUS_MULTIPROC_DIR):
+    # prometheus_client picks its mode from the environment on import, and in
+    # multiprocess mode the first metric fails without the directory: alembic
+    # and scripts import the app before main.py has created it.
+    logger.warning(
+        "%s does not exist, metrics stay single-process", PROMETHEUS_MULTIPROC_DIR
+    )
+    del os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    PROMETHEUS_MULTIPROC_DIR = None
+
+import prometheus_client  # noqa: E402
+
+from prometheus_client import CONTENT_TYPE_LATEST  # noqa: E402
+from prometheus_client import CollectorRegistry  # noqa: E402
+from prometheus_client import multiprocess  # noqa: E402
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+registry = {}
+
+
+class Metric:
+    """A Prometheus metric that also keeps this worker's values for /stats."""
+
+    kind = "untyped"
+    prometheus_class = None
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: tuple = (), **options
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.prometheus = self.prometheus_class(
+            name, documentation, self.labelnames, **options
+        )
+        self.reset()
+        registry[name] = self
+
+    def reset(self) -> None:
+        self.value = 0
+
+    def labels(self, *values: str) -> "Metric":
+        # Children are kept here so the hot path skips prometheus_client's
+        # locked label lookup after the first call.
+        child = self.children.get(values)
+        if child is None:
+            child = copy.copy(self)
+            child.prometheus = self.prometheus.labels(*values)
+            child.labelnames = ()
+            child.children = {}
+            child.reset()
+            self.children[values] = child
+        return child
+
+    def snapshot(self):
+        if self.labelnames:
+            return {
+                ",".join(values): child.snapshot()
+                for values, child in self.children.items()
+            }
+        return self.value
+
+
+class Counter(Metric):
+    kind = "counter"
+    prometheus_class = prometheus_client.Counter
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+        self.prometheus.inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+    prometheus_class = prometheus_client.Gauge
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        multiprocess_mode: str = "livesum",
+    ) -> None:
+        super().__init__(
+            name, documentation, labelnames, multiprocess_mode=multiprocess_mode
+        )
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+        self.prometheus.inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+        self.prometheus.dec(amount)
+
+    def set(self, value: float) -> None:
+        self.value = value
+        self.prometheus.set(value)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+    prometheus_class = prometheus_client.Histogram
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple = (),
+        buckets: tuple = DEFAULT_BUCKETS,
+    ) -> None:
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames, buckets=self.buckets)
+
+    def reset(self) -> None:
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.prometheus.observe(value)
+
+    def snapshot(self) -> dict:
+        if self.labelnames:
+            return super().snapshot()
+
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {"count": self.count, "sum": self.sum, "buckets": buckets}
+
+
+def snapshot() -> dict:
+    return {name: metric.snapshot() for name, metric in registry.items()}
+
+
+def exposition() -> tuple[bytes, str]:
+    if PROMETHEUS_MULTIPROC_DIR:
+        collector = CollectorRegistry()
+        multiprocess.MultiProcessCollector(collector)
+    else:
+        collector = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(collector), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead() -> None:
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
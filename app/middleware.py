@@ -0,0 +1,51 @@
+import time
+
+from . import metrics
+
+request_seconds = metrics.Histogram(
+    "http_request_duration_seconds",
+    "Request latency by route template",
+    labelnames=("method", "route"),
+)
+responses_total = metrics.Counter(
+    "http_responses",
+    "Responses by route template and status",
+    labelnames=("method", "route", "status"),
+)
+
+
+class MetricsMiddleware:
+    """Times every HTTP request and counts its response status.
+
+    Requests are labelled by the matched route template, never by the raw
+    path, so ids in query strings or paths do not create new series.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the shared scope.
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            method = scope["method"]
+            request_seconds.labels(method, path).observe(
+                time.perf_counter() - started
+            )
+            responses_total.labels(method, path, str(status_code)).inc()
@@ -0,0 +1,137 @@
+import os
+import io
+import re
+import hmac
+import time
+import pstats
+import asyncio
+import cProfile
+import logging
+
+logger = logging.getLogger(__name__)
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILING_SECRET = os.getenv("PROFILING_SECRET", "")
+PROFILING_DIR = os.getenv("PROFILING_DIR", "profiles")
+PROFILING_RATE_LIMIT = int(os.getenv("PROFILING_RATE_LIMIT", 6))
+PROFILING_EVERY_N = int(os.getenv("PROFILING_EVERY_N", 0))
+PROFILING_AGGREGATE_SIZE = int(os.getenv("PROFILING_AGGREGATE_SIZE", 100))
+
+PROFILE_HEADER = b"x-profile"
+
+
+class RateLimit:
+    """At most `limit` events per wall clock minute."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.minute = 0
+        self.used = 0
+
+    def allow(self) -> bool:
+        minute = int(time.time() // 60)
+        if minute != self.minute:
+            self.minute = minute
+            self.used = 0
+        if self.used >= self.limit:
+            return False
+        self.used += 1
+        return True
+
+
+def write_report(profile: cProfile.Profile, name: str) -> str:
+    os.makedirs(PROFILING_DIR, exist_ok=True)
+    path = os.path.join(PROFILING_DIR, name)
+    profile.dump_stats(f"{path}.prof")
+
+    text = io.StringIO()
+    stats = pstats.Stats(profile, stream=text)
+    stats.sort_stats("cumulative").print_stats(50)
+    with open(f"{path}.txt", "w") as file:
+        file.write(text.getvalue())
+    return path
+
+
+class ProfilingMiddleware:
+    """Profiles single requests on demand and every Nth request in aggregate.
+
+    A request carrying `X-Profile: <PROFILING_SECRET>` is run under cProfile
+    and gets its own report, at most PROFILING_RATE_LIMIT per minute. With
+    PROFILING_EVERY_N set, every Nth request is added to a shared profile
+    written out after PROFILING_AGGREGATE_SIZE requests.
+
+    cProfile follows the thread, so the report also holds whatever other
+    requests ran on the event loop meanwhile, and ticket rendering in the
+    process pool is not seen at all. Only one request is profiled at a time.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+        self.secret = PROFILING_SECRET.encode()
+        self.rate_limit = RateLimit(PROFILING_RATE_LIMIT)
+        self.every_n = PROFILING_EVERY_N
+        self.requests = 0
+        self.aggregate = cProfile.Profile()
+        self.aggregated = 0
+        self.busy = False
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or self.busy:
+            await self.app(scope, receive, send)
+            return
+
+        if self.secret and self._requested(scope) and self.rate_limit.allow():
+            await self._profile_one(scope, receive, send)
+            return
+
+        self.requests += 1
+        if self.every_n > 0 and self.requests % self.every_n == 0:
+            await self._profile_aggregate(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
+
+    def _requested(self, scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                return hmac.compare_digest(value, self.secret)
+        return False
+
+    async def _profile_one(self, scope, receive, send) -> None:
+        profile = cProfile.Profile()
+        self.busy = True
+        profile.enable()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profile.disable()
+            self.busy = False
+
+        route = re.sub(r"[^\w.]+", "-", scope["path"]).strip("-") or "root"
+        # The per-minute counter keeps names unique within the same second.
+        stamp = f"{time.strftime('%Y%m%d-%H%M%S')}-{self.rate_limit.used}"
+        name = f"{stamp}-{route}-{os.getpid()}"
+        path = await asyncio.to_thread(write_report, profile, name)
+        logger.info("Profile of %s written to %s", scope["path"], path)
+
+    async def _profile_aggregate(self, scope, receive, send) -> None:
+        self.busy = True
+        self.aggregate.enable()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.aggregate.disable()
+            self.busy = False
+
+        self.aggregated += 1
+        if self.aggregated < PROFILING_AGGREGATE_SIZE:
+            return
+
+        profile, self.aggregate, self.aggregated = (
+            self.aggregate,
+            cProfile.Profile(),
+            0,
+        )
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-aggregate-{os.getpid()}"
+        path = await asyncio.to_thread(write_report, profile, name)
+        logger.info("Aggregate profile written to %s", path)
@@ -0,0 +1,69 @@
+import os
+import gzip
+import hashlib
+
+from .headers import accepted
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = "static"
+# Written by scripts/optimize_lottie.py, served instead of the originals.
+OPTIMIZED_DIR = os.path.join(STATIC_DIR, "optimized")
+
+# Preferred order when the client accepts several encodings.
+ENCODINGS = ("br", "gzip")
+
+
+class StaticAsset:
+    __slots__ = ("name", "digest", "etag", "bodies")
+
+    def __init__(self, name: str, body: bytes) -> None:
+        self.name = name
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        self.etag = f'"{self.digest}"'
+        self.bodies = {"identity": body, "gzip": gzip.compress(body, 9)}
+        if brotli is not None:
+            self.bodies["br"] = brotli.compress(body, quality=11)
+
+    def encode(self, accept_encoding: str | None) -> tuple[str, bytes]:
+        encodings = accepted(accept_encoding)
+        for encoding in ENCODINGS:
+            if encoding in self.bodies and encoding in encodings:
+                return encoding, self.bodies[encoding]
+        return "identity", self.bodies["identity"]
+
+    def not_modified(self, if_none_match: str | None) -> bool:
+        if if_none_match is None:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or self.etag in tags or f"W/{self.etag}" in tags
+
+
+class StaticAssets:
+    def __init__(self, directory: str, optimized_directory: str) -> None:
+        self.directory = directory
+        self.optimized_directory = optimized_directory
+        self._assets: dict[str, StaticAsset] = {}
+
+    def load(self, names) -> None:
+        for name in names:
+            path = os.path.join(self.optimized_directory, name)
+            if not os.path.isfile(path):
+                path = os.path.join(self.directory, name)
+            with open(path, "rb") as file:
+                self._assets[name] = StaticAsset(name, file.read())
+
+    def get(self, name: str) -> StaticAsset | None:
+        return self._assets.get(name)
+
+    def urls(self, prefix: str) -> dict[str, str]:
+        return {
+            name: f"{prefix}/{asset.digest}/{name}"
+            for name, asset in self._assets.items()
+        }
+
+
+static_assets = StaticAssets(STATIC_DIR, OPTIMIZED_DIR)
@@ -0,0 +1,16 @@
+from .assets import preload_assets
+from .cache import CachedTicket
+from .cache import ticket_cache
+from .executor import render_executor
+from .formats import TICKET_FORMATS
+from .formats import VARIANTS
+from .formats import media_type
+from .formats import negotiate_format
+from .prerender import TICKET_PRERENDER_BACKFILL
+from .prerender import ticket_prerender
+from .render import record_sizes
+from .render import render_ticket
+from .singleflight import ticket_flight
+from .storage import ticket_gc
+from .storage import ticket_key
+from .storage import ticket_storage
@@ -0,0 +1,57 @@
+import threading
+import functools
+
+from PIL import Image
+from PIL import ImageDraw
+from PIL import ImageFont
+
+BASE_IMAGE_PATH = "media/tickets/base.png"
+BOLD_FONT_PATH = "media/fonts/VK Sans Display Bold.otf"
+LIGHT_FONT_PATH = "media/fonts/VK Sans Display Light.otf"
+
+NAME_COLOR = (112, 0, 255)
+STAMP_COLOR = (255, 255, 255)
+DATE_POSITION = (1361, 1063)
+TIME_POSITION = (1717, 1063)
+
+_local = threading.local()
+
+
+class TicketAssets:
+    def __init__(self) -> None:
+        self.base = Image.open(BASE_IMAGE_PATH)
+        self.base.load()
+        self.name_font = ImageFont.truetype(BOLD_FONT_PATH, 133)
+        self.stamp_font = ImageFont.truetype(LIGHT_FONT_PATH, 80)
+
+
+def get_assets() -> TicketAssets:
+    # FreeType faces are not safe to share between threads, so every render
+    # thread (or pool process) keeps its own decoded copy.
+    assets = getattr(_local, "assets", None)
+    if assets is None:
+        assets = _local.assets = TicketAssets()
+    return assets
+
+
+def preload_assets() -> None:
+    get_assets()
+
+
+@functools.lru_cache(maxsize=4)
+def stamp_layer(date_text: str, time_text: str) -> tuple[Image.Image, tuple]:
+    font = get_assets().stamp_font
+    measure = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+    date_box = measure.textbbox(DATE_POSITION, date_text, font=font)
+    time_box = measure.textbbox(TIME_POSITION, time_text, font=font)
+    left = min(date_box[0], time_box[0])
+    top = min(date_box[1], time_box[1])
+    right = max(date_box[2], time_box[2])
+    bottom = max(date_box[3], time_box[3])
+
+    layer = Image.new("RGBA", (right - left, bottom - top), STAMP_COLOR + (0,))
+    draw = ImageDraw.Draw(layer)
+    for (x, y), text in ((DATE_POSITION, date_text), (TIME_POSITION, time_text)):
+        draw.text((x - left, y - top), text, font=font, fill=STAMP_COLOR)
+
+    return layer, (left, top)
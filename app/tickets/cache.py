@@ -0,0 +1,85 @@
+import os
+import hashlib
+
+from collections import OrderedDict
+from email.utils import formatdate
+from email.utils import parsedate_to_datetime
+
+from .. import metrics
+
+TICKET_CACHE_BYTES = int(os.getenv("TICKET_CACHE_BYTES", 64 * 1024 * 1024))
+
+cache_hits = metrics.Counter("ticket_cache_hits", "Tickets served from memory")
+cache_misses = metrics.Counter(
+    "ticket_cache_misses", "Ticket cache lookups that missed"
+)
+cache_evictions = metrics.Counter(
+    "ticket_cache_evictions", "Tickets evicted from memory to stay under the limit"
+)
+cache_bytes = metrics.Gauge("ticket_cache_bytes", "Encoded ticket bytes held in memory")
+
+
+class CachedTicket:
+    __slots__ = ("body", "media_type", "etag", "modified", "last_modified")
+
+    def __init__(self, body: bytes, media_type: str, modified: float) -> None:
+        self.body = body
+        self.media_type = media_type
+        self.etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        self.modified = int(modified)
+        self.last_modified = formatdate(self.modified, usegmt=True)
+
+    def not_modified(
+        self, if_none_match: str | None, if_modified_since: str | None
+    ) -> bool:
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            return "*" in tags or self.etag in tags or f"W/{self.etag}" in tags
+
+        if if_modified_since is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return self.modified <= since
+
+        return False
+
+
+class TicketCache:
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: OrderedDict[tuple, CachedTicket] = OrderedDict()
+
+    def get(self, key: tuple) -> CachedTicket | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            cache_misses.inc()
+            return None
+
+        self._entries.move_to_end(key)
+        cache_hits.inc()
+        return entry
+
+    def put(self, key: tuple, entry: CachedTicket) -> None:
+        self.discard(key)
+        if len(entry.body) > self.max_bytes:
+            return
+
+        self._entries[key] = entry
+        self.size += len(entry.body)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted.body)
+            cache_evictions.inc()
+        cache_bytes.set(self.size)
+
+    def discard(self, key: tuple) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry.body)
+            cache_bytes.set(self.size)
+
+
+ticket_cache = TicketCache(TICKET_CACHE_BYTES)
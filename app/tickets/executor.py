@@ -0,0 +1,121 @@
+import os
+import time
+import asyncio
+import logging
+
+from concurrent.futures import Executor
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .. import metrics
+
+from .assets import preload_assets
+
+TICKET_EXECUTOR = os.getenv("TICKET_EXECUTOR", "process")
+TICKET_RENDER_WORKERS = int(os.getenv("TICKET_RENDER_WORKERS", os.cpu_count() or 1))
+
+logger = logging.getLogger(__name__)
+
+render_queue_depth = metrics.Gauge(
+    "ticket_render_queue_depth", "Ticket renders submitted and not yet finished"
+)
+render_wait_seconds = metrics.Histogram(
+    "ticket_render_wait_seconds", "Time a ticket render waited for a free worker"
+)
+render_seconds = metrics.Histogram(
+    "ticket_render_seconds", "Time spent rendering a ticket inside a worker"
+)
+
+
+def _timed(fn, args: tuple):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+class RenderExecutor:
+    def __init__(self, kind: str, max_workers: int) -> None:
+        self.kind = kind
+        self.max_workers = max(1, max_workers)
+        self._executor: Executor | None = None
+
+    def start(self) -> None:
+        if self._executor is not None:
+            return
+
+        if self.kind == "process":
+            try:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, initializer=preload_assets
+                )
+            except (ImportError, NotImplementedError, OSError):
+                logger.warning(
+                    "Process pool is unavailable, rendering tickets in threads",
+                    exc_info=True,
+                )
+                self.kind = "thread"
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="ticket-render",
+                initializer=preload_assets,
+            )
+
+    async def warm_up(self) -> None:
+        self.start()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(
+                loop.run_in_executor(self._executor, preload_assets)
+                for _ in range(self.max_workers)
+            )
+        )
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    async def drain(self, timeout: float) -> None:
+        # Renders already running finish and write their files, queued ones
+        # are dropped.
+        if self._executor is None:
+            return
+
+        executor, self._executor = self._executor, None
+        try:
+            await asyncio.wait_for(
+                asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True),
+                timeout,
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Ticket renders did not finish in %s s", timeout)
+
+    async def run(self, fn, *args):
+        self.start()
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+        render_queue_depth.inc()
+        try:
+            try:
+                result, elapsed = await loop.run_in_executor(
+                    self._executor, _timed, fn, args
+                )
+            except BrokenProcessPool:
+                logger.warning("Ticket render pool is broken, restarting it")
+                self.shutdown(wait=False)
+                self.start()
+                result, elapsed = await loop.run_in_executor(
+                    self._executor, _timed, fn, args
+                )
+        finally:
+            render_queue_depth.dec()
+
+        render_seconds.observe(elapsed)
+        render_wait_seconds.observe(max(time.perf_counter() - submitted - elapsed, 0))
+        return result
+
+
+render_executor = RenderExecutor(TICKET_EXECUTOR, TICKET_RENDER_WORKERS)
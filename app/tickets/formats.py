@@ -0,0 +1,46 @@
+import os
+
+from PIL import Image
+
+from ..headers import accepted
+
+try:
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+# name: (Pillow format, media type, save options)
+FORMATS = {
+    "avif": ("AVIF", "image/avif", {"quality": 60}),
+    "webp": ("WEBP", "image/webp", {"quality": 85, "method": 4}),
+    "png": ("PNG", "image/png", {}),
+}
+
+# Variants produced by one render, keyed by the low_quality flag: downscale factor.
+VARIANTS = {False: 1, True: 3}
+
+# Pillow registers its format plugins lazily, Image.SAVE stays empty until
+# they are loaded.
+Image.init()
+
+TICKET_FORMATS = [
+    name
+    for name in os.getenv("TICKET_FORMATS", "webp,png").split(",")
+    if name in FORMATS and FORMATS[name][0] in Image.SAVE
+]
+if "png" not in TICKET_FORMATS:
+    TICKET_FORMATS.append("png")
+
+
+def media_type(fmt: str) -> str:
+    return FORMATS[fmt][1]
+
+
+def negotiate_format(accept: str | None) -> str:
+    mime_types = accepted(accept)
+    # Wildcards are ignored on purpose: a client has to name a modern format
+    # explicitly before it gets one.
+    for fmt in TICKET_FORMATS:
+        if media_type(fmt) in mime_types:
+            return fmt
+    return "png"
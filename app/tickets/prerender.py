@@ -0,0 +1,99 @@
+import os
+import asyncio
+import logging
+
+from .. import metrics
+
+TICKET_PRERENDER_WORKERS = int(os.getenv("TICKET_PRERENDER_WORKERS", 2))
+TICKET_PRERENDER_QUEUE = int(os.getenv("TICKET_PRERENDER_QUEUE", 10000))
+TICKET_PRERENDER_BACKFILL = os.getenv("TICKET_PRERENDER_BACKFILL", "0") == "1"
+
+logger = logging.getLogger(__name__)
+
+prerender_queued = metrics.Gauge(
+    "ticket_prerender_queued", "Ticket pre-render jobs waiting in the queue"
+)
+prerender_done = metrics.Counter("ticket_prerender_done", "Tickets pre-rendered")
+prerender_failed = metrics.Counter(
+    "ticket_prerender_failed", "Pre-render jobs that failed and were left on demand"
+)
+prerender_dropped = metrics.Counter(
+    "ticket_prerender_dropped", "Pre-render jobs dropped because the queue was full"
+)
+
+
+class PrerenderQueue:
+    def __init__(self, workers: int, maxsize: int) -> None:
+        self.workers = max(1, workers)
+        self.maxsize = maxsize
+        self._job = None
+        self._queue: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._pending: set[int] = set()
+
+    def start(self, job) -> None:
+        if self._queue is not None:
+            return
+
+        self._job = job
+        self._queue = asyncio.Queue(self.maxsize)
+        self._tasks = [
+            asyncio.create_task(self._worker()) for _ in range(self.workers)
+        ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self._pending.clear()
+        prerender_queued.set(0)
+
+    def submit(self, vk_user_id: int) -> bool:
+        """Queue a job without waiting. A full queue drops the job, the ticket
+        is then rendered on demand."""
+        if self._queue is None:
+            return False
+        if vk_user_id in self._pending:
+            return True
+
+        try:
+            self._queue.put_nowait(vk_user_id)
+        except asyncio.QueueFull:
+            prerender_dropped.inc()
+            return False
+
+        self._pending.add(vk_user_id)
+        prerender_queued.set(self._queue.qsize())
+        return True
+
+    async def put(self, vk_user_id: int) -> None:
+        """Queue a job, waiting for room. Used by the backfill."""
+        if self._queue is None or vk_user_id in self._pending:
+            return
+
+        self._pending.add(vk_user_id)
+        await self._queue.put(vk_user_id)
+        prerender_queued.set(self._queue.qsize())
+
+    async def _worker(self) -> None:
+        while True:
+            vk_user_id = await self._queue.get()
+            prerender_queued.set(self._queue.qsize())
+            try:
+                await self._job(vk_user_id)
+                prerender_done.inc()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                prerender_failed.inc()
+                logger.warning(
+                    "Failed to pre-render ticket for %s", vk_user_id, exc_info=True
+                )
+            finally:
+                self._pending.discard(vk_user_id)
+                self._queue.task_done()
+
+
+ticket_prerender = PrerenderQueue(TICKET_PRERENDER_WORKERS, TICKET_PRERENDER_QUEUE)
@@ -0,0 +1,55 @@
+from io import BytesIO
+
+from PIL import ImageDraw
+
+from .. import metrics
+
+from .assets import NAME_COLOR
+from .assets import get_assets
+from .assets import stamp_layer
+from .formats import FORMATS
+from .formats import VARIANTS
+
+encoded_bytes = metrics.Histogram(
+    "ticket_encoded_bytes",
+    "Size of an encoded ticket by format and variant",
+    labelnames=("format", "variant"),
+    buckets=(25_000, 50_000, 100_000, 200_000, 400_000, 800_000, 1_600_000),
+)
+
+
+def render_ticket(
+    first_name: str,
+    last_name: str,
+    date_text: str,
+    time_text: str,
+    fmt: str,
+) -> dict[bool, bytes]:
+    assets = get_assets()
+    image = assets.base.copy()
+    draw = ImageDraw.Draw(image)
+
+    draw.text((1357, 457), first_name, font=assets.name_font, fill=NAME_COLOR)
+    draw.text((1357, 595), last_name, font=assets.name_font, fill=NAME_COLOR)
+
+    # Date and time are shared by everyone rendered within the same minute.
+    layer, position = stamp_layer(date_text, time_text)
+    image.paste(layer, position, layer)
+
+    pillow_format, _, options = FORMATS[fmt]
+    bodies = {}
+    for low_quality, scale in VARIANTS.items():
+        variant = image.reduce(scale) if scale > 1 else image
+        buffer = BytesIO()
+        variant.save(buffer, format=pillow_format, **options)
+        bodies[low_quality] = buffer.getvalue()
+
+    return bodies
+
+
+def record_sizes(fmt: str, bodies: dict[bool, bytes]) -> None:
+    # Called by the caller of the render pool, so sizes are counted in the
+    # serving process even when rendering happens in a child process.
+    for low_quality, body in bodies.items():
+        encoded_bytes.labels(fmt, "low" if low_quality else "full").observe(len(body))
+
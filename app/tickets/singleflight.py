@@ -0,0 +1,28 @@
+import asyncio
+
+from .. import metrics
+
+shared_calls = metrics.Counter(
+    "ticket_render_shared_calls", "Callers that joined an in-flight ticket render"
+)
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._calls: dict[tuple, asyncio.Task] = {}
+
+    async def do(self, key: tuple, fn, *args):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args))
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            shared_calls.inc()
+
+        # Shielded so that one caller going away does not cancel the render
+        # the others are waiting for.
+        return await asyncio.shield(task)
+
+
+ticket_flight = SingleFlight()
@@ -0,0 +1,304 @@
+import os
+import re
+import time
+import asyncio
+import hashlib
+import logging
+import tempfile
+
+from abc import ABC
+from abc import abstractmethod
+
+from .. import metrics
+
+try:
+    import boto3
+
+    from botocore.exceptions import ClientError
+except ImportError:
+    boto3 = None
+
+TICKET_STORAGE = os.getenv("TICKET_STORAGE", "local")
+TICKET_STORAGE_DIR = os.getenv("TICKET_STORAGE_DIR", "media/tickets")
+TICKET_S3_BUCKET = os.getenv("TICKET_S3_BUCKET")
+TICKET_S3_PREFIX = os.getenv("TICKET_S3_PREFIX", "tickets/")
+TICKET_S3_ENDPOINT_URL = os.getenv("TICKET_S3_ENDPOINT_URL")
+TICKET_GC_MAX_AGE = float(os.getenv("TICKET_GC_MAX_AGE_DAYS", 0)) * 86400
+TICKET_GC_MAX_BYTES = int(os.getenv("TICKET_GC_MAX_BYTES", 0))
+TICKET_GC_INTERVAL = float(os.getenv("TICKET_GC_INTERVAL", 3600))
+
+logger = logging.getLogger(__name__)
+
+gc_removed = metrics.Counter(
+    "ticket_storage_gc_removed", "Stored tickets removed by the garbage collector"
+)
+gc_seconds = metrics.Histogram(
+    "ticket_storage_gc_seconds", "Duration of one garbage collection pass"
+)
+
+
+_legacy_ticket = re.compile(r"^\d+(low)?\.\w+$")
+
+
+def ticket_key(vk_user_id: int, low_quality: bool, fmt: str) -> str:
+    # Two levels of 256 directories keep every directory small.
+    digest = hashlib.sha1(str(vk_user_id).encode()).hexdigest()
+    suffix = "low" if low_quality else ""
+    return f"{digest[:2]}/{digest[2:4]}/{vk_user_id}{suffix}.{fmt}"
+
+
+def expired(items: list[tuple], max_age: float, max_bytes: int) -> list:
+    """Keys of (key, modified, size) items to remove, oldest first.
+
+    Items older than max_age go first, then the oldest of the rest until
+    their total size fits in max_bytes; zero turns a limit off.
+    """
+    items = sorted(items, key=lambda item: item[1])
+    count = 0
+    if max_age > 0:
+        cutoff = time.time() - max_age
+        while count < len(items) and items[count][1] < cutoff:
+            count += 1
+
+    if max_bytes > 0:
+        total = sum(size for _, _, size in items[count:])
+        while count < len(items) and total > max_bytes:
+            total -= items[count][2]
+            count += 1
+    return [key for key, _, _ in items[:count]]
+
+
+class TicketStorage(ABC):
+    """Blocking store of encoded tickets, used from threads."""
+
+    @abstractmethod
+    def load(self, keys: dict) -> dict | None:
+        """{variant: (body, modified)} or None if any of the keys is missing."""
+
+    @abstractmethod
+    def save(self, key: str, body: bytes) -> None:
+        pass
+
+    def save_all(self, bodies: dict) -> None:
+        for key, body in bodies.items():
+            self.save(key, body)
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        pass
+
+    @abstractmethod
+    def collect_garbage(self, max_age: float, max_bytes: int) -> int:
+        """Removes tickets past the limits, see expired(); returns how many."""
+
+
+class LocalStorage(TicketStorage):
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def load(self, keys: dict) -> dict | None:
+        loaded = {}
+        for variant, key in keys.items():
+            path = self.path(key)
+            try:
+                file = open(path, "rb")
+            except FileNotFoundError:
+                if not self._migrate(key):
+                    return None
+                file = open(path, "rb")
+            with file:
+                loaded[variant] = (file.read(), os.fstat(file.fileno()).st_mtime)
+        return loaded
+
+    def _migrate(self, key: str) -> bool:
+        # Tickets rendered before sharding sit flat in the directory root.
+        legacy = self.path(key.rsplit("/", 1)[1])
+        if not os.path.isfile(legacy):
+            return False
+        try:
+            os.makedirs(os.path.dirname(self.path(key)), exist_ok=True)
+            os.replace(legacy, self.path(key))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def save(self, key: str, body: bytes) -> None:
+        path = self.path(key)
+        directory, name = os.path.split(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}.")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(body)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self.path(key)) or self._migrate(key)
+
+    def collect_garbage(self, max_age: float, max_bytes: int) -> int:
+        items = []
+        for entry in self._tickets():
+            stat = entry.stat()
+            items.append((entry.path, stat.st_mtime, stat.st_size))
+
+        removed = 0
+        for path in expired(items, max_age, max_bytes):
+            try:
+                os.unlink(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def _tickets(self):
+        if not os.path.isdir(self.directory):
+            return
+        with os.scandir(self.directory) as firsts:
+            for first in firsts:
+                # Tickets from before sharding that were never requested
+                # again still sit flat in the root, next to base.png.
+                if first.is_file() and _legacy_ticket.match(first.name):
+                    yield first
+                if not first.is_dir() or len(first.name) != 2:
+                    continue
+                with os.scandir(first.path) as seconds:
+                    for second in seconds:
+                        if second.is_dir() and len(second.name) == 2:
+                            yield from self._shard_tickets(second.path)
+
+    def _shard_tickets(self, shard: str):
+        with os.scandir(shard) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.startswith("."):
+                    yield entry
+
+
+class S3Storage(TicketStorage):
+    """Any S3 compatible store; endpoint_url points it at MinIO and the like.
+
+    Credentials and region come from the usual AWS_* environment variables.
+    """
+
+    def __init__(self, bucket: str, prefix: str, endpoint_url: str | None) -> None:
+        if boto3 is None:
+            raise RuntimeError("TICKET_STORAGE=s3 needs boto3")
+        if not bucket:
+            raise RuntimeError("TICKET_STORAGE=s3 needs TICKET_S3_BUCKET")
+
+        self.bucket = bucket
+        self.prefix = prefix
+        # boto3 clients are thread safe, unlike sessions and resources.
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+
+    def load(self, keys: dict) -> dict | None:
+        loaded = {}
+        for variant, key in keys.items():
+            try:
+                response = self.client.get_object(
+                    Bucket=self.bucket, Key=self.prefix + key
+                )
+            except ClientError as exc:
+                if exc.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                    return None
+                raise
+            with response["Body"] as body:
+                loaded[variant] = (body.read(), response["LastModified"].timestamp())
+        return loaded
+
+    def save(self, key: str, body: bytes) -> None:
+        # A PUT replaces the object as a whole, readers never see a part.
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=body)
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+        except ClientError as exc:
+            if exc.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return False
+            raise
+        return True
+
+    def collect_garbage(self, max_age: float, max_bytes: int) -> int:
+        items = []
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get("Contents", ()):
+                modified = item["LastModified"].timestamp()
+                items.append((item["Key"], modified, item["Size"]))
+
+        removed = expired(items, max_age, max_bytes)
+        for start in range(0, len(removed), 1000):
+            self.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={
+                    "Objects": [{"Key": key} for key in removed[start : start + 1000]],
+                    "Quiet": True,
+                },
+            )
+        return len(removed)
+
+
+def create_storage(kind: str) -> TicketStorage:
+    if kind == "s3":
+        return S3Storage(TICKET_S3_BUCKET, TICKET_S3_PREFIX, TICKET_S3_ENDPOINT_URL)
+    if kind == "local":
+        return LocalStorage(TICKET_STORAGE_DIR)
+    raise RuntimeError(f"Unknown TICKET_STORAGE: {kind!r}")
+
+
+class GarbageCollector:
+    """Periodically removes stored tickets past the age or size limit.
+
+    Every worker runs one; passes are idempotent, so overlapping ones only
+    cost an extra listing.
+    """
+
+    def __init__(
+        self, storage: TicketStorage, interval: float, max_age: float, max_bytes: int
+    ) -> None:
+        self.storage = storage
+        self.interval = interval
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None and (self.max_age > 0 or self.max_bytes > 0):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def collect(self) -> int:
+        started = time.perf_counter()
+        removed = await asyncio.to_thread(
+            self.storage.collect_garbage, self.max_age, self.max_bytes
+        )
+        gc_seconds.observe(time.perf_counter() - started)
+        gc_removed.inc(removed)
+        return removed
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                removed = await self.collect()
+                if removed:
+                    logger.info("Removed %s stored tickets", removed)
+            except Exception:
+                logger.exception("Ticket garbage collection failed")
+            await asyncio.sleep(self.interval)
+
+
+ticket_storage = create_storage(TICKET_STORAGE)
+ticket_gc = GarbageCollector(
+    ticket_storage, TICKET_GC_INTERVAL, TICKET_GC_MAX_AGE, TICKET_GC_MAX_BYTES
+)
@@ -1,7 +1,57 @@
+import os
+import shutil
+
 import uvicorn
 
-from app import app
+if hasattr(os, "sched_getaffinity"):
+    CPU_COUNT = len(os.sched_getaffinity(0))
+else:
+    CPU_COUNT = os.cpu_count() or 1
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", 8000))
+WEB_WORKERS = max(int(os.getenv("WEB_WORKERS", CPU_COUNT)), 1)
+KEEP_ALIVE = int(os.getenv("KEEP_ALIVE", 75))
+BACKLOG = int(os.getenv("BACKLOG", 2048))
+DEV_RELOAD = os.getenv("DEV_RELOAD", "0") == "1"
+
+# Every worker has its own ticket render pool, so the CPUs are split
+# between them instead of each pool taking all of them.
+os.environ.setdefault("TICKET_RENDER_WORKERS", str(max(CPU_COUNT // WEB_WORKERS, 1)))
+# Each worker caches users, so with several of them a change made by one has
+# to evict the copies the others hold.
+os.environ.setdefault(
+    "USER_CACHE_NOTIFY", "1" if WEB_WORKERS > 1 and not DEV_RELOAD else "0"
+)
+
+
+def reset_metrics_directory() -> None:
+    # Samples left by the workers of a previous run would be merged in.
+    directory = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+
+# Before the app is imported: its metrics open their sample files on import,
+# and a single worker runs in this very process.
+if __name__ == "__main__":
+    reset_metrics_directory()
+
+from app import app  # noqa: E402
 
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    if DEV_RELOAD:
+        uvicorn.run("main:app", host=HOST, port=PORT, reload=True)
+    else:
+        uvicorn.run(
+            "main:app",
+            host=HOST,
+            port=PORT,
+            workers=WEB_WORKERS,
+            loop="uvloop",
+            http="httptools",
+            timeout_keep_alive=KEEP_ALIVE,
+            backlog=BACKLOG,
+        )
@@ -0,0 +1,64 @@
+"""Export users as CSV or NDJSON without loading the table into memory.
+
+    python scripts/export_users.py --format csv --is-test-passed true -o winners.csv
+
+Reads DATABASE_URL like the app does.
+"""
+import os
+import sys
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.core import engine  # noqa: E402
+from app.db.export import EXPORT_CHUNK_ROWS  # noqa: E402
+from app.db.export import EXPORT_FORMATS  # noqa: E402
+from app.db.export import export_users  # noqa: E402
+
+
+def flag(value: str) -> bool:
+    if value.lower() in ("1", "true", "yes"):
+        return True
+    if value.lower() in ("0", "false", "no"):
+        return False
+    raise argparse.ArgumentTypeError(f"expected true or false, got {value!r}")
+
+
+async def export(args, output) -> int:
+    rows = 0
+    try:
+        async for chunk in export_users(
+            args.format,
+            is_test_passed=args.is_test_passed,
+            onboarding=args.onboarding,
+            chunk_rows=args.chunk_rows,
+        ):
+            output.write(chunk)
+            rows += chunk.count(b"\n")
+    finally:
+        await engine.dispose()
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Export users")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="csv")
+    parser.add_argument("--is-test-passed", type=flag)
+    parser.add_argument("--onboarding", type=flag)
+    parser.add_argument("--chunk-rows", type=int, default=EXPORT_CHUNK_ROWS)
+    parser.add_argument("-o", "--output", help="file to write, stdout by default")
+    args = parser.parse_args(argv)
+
+    if args.output:
+        with open(args.output, "wb") as output:
+            rows = asyncio.run(export(args, output))
+    else:
+        rows = asyncio.run(export(args, sys.stdout.buffer))
+
+    print(f"{rows} lines written", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""Write render-only copies of the planet Lottie files to static/optimized.
+
+    python scripts/optimize_lottie.py [--decimals 3] [--source static]
+
+Authoring metadata is dropped (the top-level "meta" block, layer and shape
+names, After Effects match names and property indexes), floats are rounded,
+animated properties whose keyframes never change become static values and
+identical precomp assets are merged. The optimized copy is checked against
+the original for frame rate, in/out points and layer structure before it is
+written, and a per-file size report is stored next to the copies.
+"""
+import os
+import sys
+import json
+import argparse
+
+# Only read by expressions and the authoring tools, never by the player.
+AUTHORING_KEYS = {"nm", "mn", "ix", "cix", "np"}
+
+
+class FidelityError(Exception):
+    pass
+
+
+def has_expressions(node) -> bool:
+    if isinstance(node, dict):
+        if isinstance(node.get("x"), str):
+            return True
+        return any(has_expressions(value) for value in node.values())
+    if isinstance(node, list):
+        return any(has_expressions(value) for value in node)
+    return False
+
+
+def round_number(value, decimals: int):
+    if isinstance(value, bool) or not isinstance(value, float):
+        return value
+    value = round(value, decimals)
+    return int(value) if value.is_integer() else value
+
+
+def collapse_keyframes(node: dict) -> dict:
+    keyframes = node.get("k")
+    if node.get("a") != 1 or not isinstance(keyframes, list) or not keyframes:
+        return node
+    if not all(isinstance(frame, dict) and "s" in frame for frame in keyframes):
+        return node
+
+    # Bodymovin 4 keyframes also carry their end value in "e", and spatial
+    # tangents move a position along a curve even between equal values.
+    value = keyframes[0]["s"]
+    for frame in keyframes:
+        if frame["s"] != value or frame.get("e", value) != value:
+            return node
+        if any(any(frame.get(key) or ()) for key in ("ti", "to")):
+            return node
+
+    if isinstance(value, list) and len(value) == 1:
+        value = value[0]
+    collapsed = {key: item for key, item in node.items() if key not in ("a", "k")}
+    collapsed.update(a=0, k=value)
+    return collapsed
+
+
+def optimize_node(node, decimals: int, strip_names: bool):
+    if isinstance(node, list):
+        return [optimize_node(value, decimals, strip_names) for value in node]
+    if not isinstance(node, dict):
+        return round_number(node, decimals)
+
+    result = {}
+    for key, value in node.items():
+        if strip_names and key in AUTHORING_KEYS:
+            continue
+        if key == "hd" and value is False:
+            continue
+        result[key] = optimize_node(value, decimals, strip_names)
+    return collapse_keyframes(result)
+
+
+def merge_assets(animation: dict) -> dict:
+    seen = {}
+    renamed = {}
+    assets = []
+    for asset in animation.get("assets", []):
+        body = json.dumps({k: v for k, v in asset.items() if k != "id"}, sort_keys=True)
+        if body in seen and "layers" in asset:
+            renamed[asset["id"]] = seen[body]
+            continue
+        seen.setdefault(body, asset.get("id"))
+        assets.append(asset)
+
+    if not renamed:
+        return animation
+
+    def relink(node):
+        if isinstance(node, list):
+            return [relink(value) for value in node]
+        if isinstance(node, dict):
+            node = {key: relink(value) for key, value in node.items()}
+            if node.get("refId") in renamed:
+                node["refId"] = renamed[node["refId"]]
+        return node
+
+    animation = dict(animation, assets=assets)
+    return relink(animation)
+
+
+def optimize(animation: dict, decimals: int) -> dict:
+    strip_names = not has_expressions(animation)
+    result = {key: value for key, value in animation.items() if key != "meta"}
+    result = optimize_node(result, decimals, strip_names)
+    return merge_assets(result)
+
+
+def structure(animation: dict) -> dict:
+    def layers(items):
+        return [
+            (
+                layer.get("ty"),
+                layer.get("ind"),
+                layer.get("parent"),
+                layer.get("refId"),
+                layer.get("ip"),
+                layer.get("op"),
+                shapes(layer.get("shapes", [])),
+            )
+            for layer in items
+        ]
+
+    def shapes(items):
+        return [(shape.get("ty"), shapes(shape.get("it", []))) for shape in items]
+
+    return {
+        "frames": [animation.get(key) for key in ("fr", "ip", "op", "w", "h")],
+        "layers": layers(animation.get("layers", [])),
+        "assets": sorted(
+            len(asset.get("layers", [])) for asset in animation.get("assets", [])
+        ),
+    }
+
+
+def check_fidelity(original: dict, optimized: dict) -> None:
+    before, after = structure(original), structure(optimized)
+    for key in before:
+        if key == "assets":
+            # Merged assets leave fewer entries, but every one kept must
+            # match an original.
+            if not set(after[key]) <= set(before[key]):
+                raise FidelityError(key)
+        elif before[key] != after[key]:
+            raise FidelityError(key)
+
+
+def dump(animation: dict) -> bytes:
+    return json.dumps(animation, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", default="static")
+    parser.add_argument("--target", default=None)
+    parser.add_argument("--decimals", type=int, default=3)
+    args = parser.parse_args(argv)
+    target = args.target or os.path.join(args.source, "optimized")
+    os.makedirs(target, exist_ok=True)
+
+    report = {"decimals": args.decimals, "files": {}}
+    for name in sorted(os.listdir(args.source)):
+        path = os.path.join(args.source, name)
+        if not name.endswith(".json") or not os.path.isfile(path):
+            continue
+
+        with open(path, "rb") as file:
+            source = file.read()
+        original = json.loads(source)
+        optimized = optimize(original, args.decimals)
+        try:
+            check_fidelity(original, optimized)
+        except FidelityError as exc:
+            print(f"{name}: structure changed ({exc}), not written", file=sys.stderr)
+            return 1
+
+        body = dump(optimized)
+        with open(os.path.join(target, name), "wb") as file:
+            file.write(body)
+
+        report["files"][name] = {"before": len(source), "after": len(body)}
+        print(f"{name:<14} {len(source):>7} -> {len(body):>7} bytes")
+
+    before = sum(item["before"] for item in report["files"].values())
+    after = sum(item["after"] for item in report["files"].values())
+    report["total"] = {"before": before, "after": after}
+    print(f"{'total':<14} {before:>7} -> {after:>7} bytes")
+
+    with open(os.path.join(target, "report.json"), "w") as file:
+        json.dump(report, file, indent=2)
+        file.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+import random
+import asyncio
+
+from app.db.attempts_buffer import AttemptsBuffer
+
+USERS = range(10)
+
+
+class StubDatabase:
+    """Stands in for write_attempts: slow, and failing every other write
+    before it commits when `failing` is set."""
+
+    def __init__(self, failing: bool) -> None:
+        self.failing = failing
+        self.writes = 0
+        self.attempts = dict.fromkeys(USERS, 0)
+
+    async def write(self, batch: dict, committed) -> None:
+        self.writes += 1
+        await asyncio.sleep(0.002)
+        if self.failing and self.writes % 2:
+            raise ConnectionError("connection lost")
+        for vk_user_id, amount in batch.items():
+            self.attempts[vk_user_id] += amount
+        committed()
+        # The session is still being closed after the commit.
+        await asyncio.sleep(0.002)
+
+
+async def play(failing: bool) -> tuple[StubDatabase, dict]:
+    database = StubDatabase(failing)
+    buffer = AttemptsBuffer(True, 0.001, 25)
+    buffer.start(database.write)
+    added = dict.fromkeys(USERS, 0)
+    miscounts = []
+
+    async def player(vk_user_id: int) -> None:
+        for _ in range(100):
+            buffer.add(vk_user_id)
+            added[vk_user_id] += 1
+            await asyncio.sleep(random.random() / 1000)
+
+    async def reader() -> None:
+        # What /users/getinfo shows must never count an increment twice,
+        # or miss one, whatever the flush is doing.
+        while True:
+            for vk_user_id in USERS:
+                shown = database.attempts[vk_user_id] + buffer.pending(vk_user_id)
+                if shown != added[vk_user_id]:
+                    miscounts.append((vk_user_id, shown, added[vk_user_id]))
+            await asyncio.sleep(0)
+
+    reading = asyncio.create_task(reader())
+    await asyncio.gather(*(player(vk_user_id) for vk_user_id in USERS))
+    database.failing = False
+    await buffer.stop()
+    reading.cancel()
+
+    assert miscounts == []
+    return database, added
+
+
+def test_no_increments_lost_across_flushes():
+    database, added = asyncio.run(play(failing=False))
+    assert database.writes > 1
+    assert database.attempts == added
+
+
+def test_failed_flushes_are_retried():
+    database, added = asyncio.run(play(failing=True))
+    assert database.writes > 2
+    assert database.attempts == added
@@ -0,0 +1,25 @@
+from app.db.export import encode_csv
+from app.db.export import encode_ndjson
+
+ROWS = [
+    (1, True, False, 3, "=HYPERLINK(\"http://x\")", "+7"),
+    (2, False, False, 0, "-Ivan", "@Ivanov"),
+    (3, False, True, 1, "\tTab", "\rReturn"),
+    (4, True, True, 2, "Ivan", "Ivanov-Petrov"),
+]
+
+
+def test_csv_escapes_formulas():
+    lines = encode_csv(ROWS, True).decode().split("\r\n")
+    assert lines[0] == "user_id,onboarding,is_test_passed,attempts,first_name,last_name"
+    assert lines[1] == "1,True,False,3,\"'=HYPERLINK(\"\"http://x\"\")\",'+7"
+    assert lines[2] == "2,False,False,0,'-Ivan,'@Ivanov"
+    assert lines[3] == "3,False,True,1,'\tTab,\"'\rReturn\""
+    assert lines[4] == "4,True,True,2,Ivan,Ivanov-Petrov"
+
+
+def test_ndjson_keeps_names_as_they_are():
+    assert encode_ndjson(ROWS[1:2]) == (
+        b'{"user_id":2,"onboarding":false,"is_test_passed":false,"attempts":0,'
+        b'"first_name":"-Ivan","last_name":"@Ivanov"}\n'
+    )
@@ -0,0 +1,53 @@
+import pytest
+
+from app.api.launch_params import InvalidSignature
+from app.api.launch_params import LaunchParamsVerifier
+from app.api.launch_params import MalformedLaunchParams
+from app.lru import TTLCache
+
+VK_PARAMS = {"vk_app_id": "51000000", "vk_user_id": "1234567", "vk_ts": "1700000000"}
+
+
+@pytest.fixture
+def verifier():
+    return LaunchParamsVerifier("secret", TTLCache(100, 60))
+
+
+def launch_params(verifier, vk_params=VK_PARAMS, sign=None) -> str:
+    if sign is None:
+        sign = verifier.sign(vk_params)
+    query = "&".join(f"{key}={value}" for key, value in vk_params.items())
+    return f"VK {query}&sign={sign}"
+
+
+def test_valid_sign(verifier):
+    assert verifier.verify(launch_params(verifier)) == 1234567
+    # The second time it comes from the cache.
+    assert verifier.verify(launch_params(verifier)) == 1234567
+
+
+def test_wrong_sign(verifier):
+    with pytest.raises(InvalidSignature):
+        verifier.verify(launch_params(verifier, sign="A" * 43))
+
+
+def test_non_ascii_sign(verifier):
+    with pytest.raises(InvalidSignature):
+        verifier.verify(launch_params(verifier, sign="éé"))
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "vk_user_id=1=x&sign=abc",
+        "vk_user_id=1&&sign=abc",
+        "vk_user_id=1&vk_ts&sign=abc",
+        "vk_app_id=51000000&sign=abc",
+        "vk_user_id=abc&sign=abc",
+        "vk_user_id=1",
+        "",
+    ],
+)
+def test_malformed(verifier, query):
+    with pytest.raises(MalformedLaunchParams):
+        verifier.verify(f"VK {query}")
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from app.db import core
+
+
+class StubSession:
+    def __init__(self, bind, expire_on_commit: bool) -> None:
+        self.bind = bind
+
+    async def rollback(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class StubConnection:
+    def __init__(self, pool) -> None:
+        self.pool = pool
+
+    async def close(self) -> None:
+        self.pool.checked_out -= 1
+
+
+class StubEngine:
+    def __init__(self) -> None:
+        self.checked_out = 0
+        self.checkouts = 0
+
+    async def connect(self) -> StubConnection:
+        self.checked_out += 1
+        self.checkouts += 1
+        return StubConnection(self)
+
+
+async def in_request(engine: StubEngine) -> None:
+    requests = core.request_session()
+    holder = await requests.__anext__()
+
+    async with core.session_scope() as session:
+        async with core.session_scope() as nested:
+            assert nested is session
+        assert engine.checked_out == 1
+
+    # No connection is held while the request waits on a render or on VK.
+    assert engine.checked_out == 0
+    await asyncio.sleep(0)
+
+    with pytest.raises(RuntimeError):
+        async with core.session_scope():
+            assert engine.checked_out == 1
+            raise RuntimeError
+    assert engine.checked_out == 0
+
+    await requests.aclose()
+    assert holder.closed
+
+
+def test_connection_held_only_inside_blocks(monkeypatch):
+    engine = StubEngine()
+    monkeypatch.setattr(core, "engine", engine)
+    monkeypatch.setattr(core, "AsyncSession", StubSession)
+
+    asyncio.run(in_request(engine))
+
+    assert engine.checkouts == 2
+    assert engine.checked_out == 0
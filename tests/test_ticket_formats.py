@@ -0,0 +1,18 @@
+from PIL import features
+
+from app.tickets.formats import TICKET_FORMATS
+from app.tickets.formats import negotiate_format
+
+
+def test_webp_is_offered():
+    assert features.check("webp")
+    assert TICKET_FORMATS[:1] == ["webp"]
+    assert "png" in TICKET_FORMATS
+
+
+def test_negotiate_from_accept():
+    assert negotiate_format("image/avif,image/webp,*/*") == "webp"
+    assert negotiate_format("image/webp;q=0.9, image/png") == "webp"
+    assert negotiate_format("image/png,*/*") == "png"
+    assert negotiate_format("*/*") == "png"
+    assert negotiate_format(None) == "png"
@@ -0,0 +1,62 @@
+import asyncio
+import contextlib
+
+from app.api.endpoints import dependencies
+from app.tickets.cache import TicketCache
+from app.tickets.formats import TICKET_FORMATS
+from app.tickets.storage import LocalStorage
+
+from test_ticket_singleflight import StubRenderExecutor
+from test_ticket_singleflight import stub_get_names
+from test_ticket_singleflight import stub_get_or_create_user
+
+
+def stub_lock(locked: bool):
+    @contextlib.asynccontextmanager
+    async def advisory_lock(key):
+        yield locked
+
+    return advisory_lock
+
+
+class StubQueue:
+    def __init__(self) -> None:
+        self.queued = []
+
+    async def put(self, vk_user_id) -> None:
+        self.queued.append(vk_user_id)
+
+
+async def passed_user_ids():
+    for vk_user_id in (1, 2, 3):
+        yield vk_user_id
+
+
+def test_prerender_renders_the_preferred_format_only(monkeypatch, tmp_path):
+    executor = StubRenderExecutor()
+    storage = LocalStorage(str(tmp_path))
+    monkeypatch.setattr(dependencies, "render_executor", executor)
+    monkeypatch.setattr(dependencies, "ticket_cache", TicketCache(1024 * 1024))
+    monkeypatch.setattr(dependencies, "ticket_storage", storage)
+    monkeypatch.setattr(dependencies, "get_or_create_user", stub_get_or_create_user)
+    monkeypatch.setattr(dependencies, "get_names", stub_get_names)
+
+    asyncio.run(dependencies.prerender_ticket(1))
+
+    assert len(TICKET_FORMATS) > 1
+    assert executor.calls == 1
+    assert storage.exists(dependencies.ticket_key(1, False, TICKET_FORMATS[0]))
+
+
+def test_backfill_runs_in_the_worker_holding_the_lock(monkeypatch, tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    storage.save(dependencies.ticket_key(2, False, TICKET_FORMATS[0]), b"stored")
+    monkeypatch.setattr(dependencies, "ticket_storage", storage)
+    monkeypatch.setattr(dependencies, "iter_passed_user_ids", passed_user_ids)
+
+    for locked, expected in ((False, []), (True, [1, 3])):
+        queue = StubQueue()
+        monkeypatch.setattr(dependencies, "ticket_prerender", queue)
+        monkeypatch.setattr(dependencies, "advisory_lock", stub_lock(locked))
+        asyncio.run(dependencies.backfill_tickets())
+        assert queue.queued == expected
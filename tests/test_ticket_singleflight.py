@@ -0,0 +1,45 @@
+import asyncio
+
+from app.api.endpoints import dependencies
+from app.tickets.cache import TicketCache
+from app.tickets.storage import LocalStorage
+
+
+class StubRenderExecutor:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def run(self, fn, first_name, last_name, date, time, fmt):
+        self.calls += 1
+        # Long enough for every other caller to arrive while it runs.
+        await asyncio.sleep(0.05)
+        return {False: b"full", True: b"low"}
+
+
+async def stub_get_or_create_user(vk_user_id):
+    return vk_user_id
+
+
+async def stub_get_names(db_user):
+    return "Ivan", "Ivanov"
+
+
+def test_concurrent_requests_render_once(monkeypatch, tmp_path):
+    executor = StubRenderExecutor()
+    monkeypatch.setattr(dependencies, "render_executor", executor)
+    monkeypatch.setattr(dependencies, "ticket_cache", TicketCache(1024 * 1024))
+    monkeypatch.setattr(dependencies, "ticket_storage", LocalStorage(str(tmp_path)))
+    monkeypatch.setattr(dependencies, "get_or_create_user", stub_get_or_create_user)
+    monkeypatch.setattr(dependencies, "get_names", stub_get_names)
+
+    async def main():
+        return await asyncio.gather(
+            *(dependencies.get_ticket(1, i % 2 == 1, "png") for i in range(50))
+        )
+
+    entries = asyncio.run(main())
+
+    assert executor.calls == 1
+    assert [entry.body for entry in entries[:2]] == [b"full", b"low"]
+    assert {entry.body for entry in entries[::2]} == {b"full"}
+    assert {entry.body for entry in entries[1::2]} == {b"low"}
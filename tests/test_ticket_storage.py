@@ -0,0 +1,78 @@
+import os
+import time
+
+import pytest
+
+from app.tickets.storage import LocalStorage
+from app.tickets.storage import S3Storage
+from app.tickets.storage import ticket_key
+
+KEYS = {False: ticket_key(1, False, "png"), True: ticket_key(1, True, "png")}
+
+
+@pytest.fixture
+def s3_storage(monkeypatch):
+    moto = pytest.importorskip("moto")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with moto.mock_aws():
+        storage = S3Storage("tickets", "tickets/", None)
+        storage.client.create_bucket(Bucket="tickets")
+        yield storage
+
+
+def test_s3_save_and_load(s3_storage):
+    assert s3_storage.load(KEYS) is None
+    assert not s3_storage.exists(KEYS[False])
+
+    s3_storage.save_all({KEYS[False]: b"full", KEYS[True]: b"low"})
+
+    assert s3_storage.exists(KEYS[False])
+    loaded = s3_storage.load(KEYS)
+    assert {variant: body for variant, (body, _) in loaded.items()} == {
+        False: b"full",
+        True: b"low",
+    }
+    assert abs(loaded[False][1] - time.time()) < 60
+    listed = s3_storage.client.list_objects_v2(Bucket="tickets")["Contents"]
+    assert {item["Key"] for item in listed} == {
+        f"tickets/{key}" for key in KEYS.values()
+    }
+
+
+def test_s3_load_needs_every_variant(s3_storage):
+    s3_storage.save(KEYS[False], b"full")
+    assert s3_storage.load(KEYS) is None
+
+
+def test_s3_collect_garbage(s3_storage, monkeypatch):
+    for vk_user_id in range(5):
+        s3_storage.save(ticket_key(vk_user_id, False, "png"), b"x" * 100)
+    s3_storage.client.put_object(Bucket="tickets", Key="other/file", Body=b"x")
+
+    assert s3_storage.collect_garbage(0, 0) == 0
+    # Every object is as old as the others, so only the size limit removes.
+    assert s3_storage.collect_garbage(0, 250) == 3
+    assert sum(s3_storage.exists(ticket_key(i, False, "png")) for i in range(5)) == 2
+    assert s3_storage.collect_garbage(3600, 0) == 0
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 7200)
+    assert s3_storage.collect_garbage(3600, 0) == 2
+    # Objects outside the prefix are not tickets.
+    s3_storage.client.head_object(Bucket="tickets", Key="other/file")
+
+
+def test_local_collect_garbage_includes_flat_tickets(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    storage.save(ticket_key(1, False, "png"), b"sharded")
+    for name in ("2.png", "2low.webp", "base.png"):
+        (tmp_path / name).write_bytes(b"flat")
+    old = time.time() - 3600
+    for name in ("2.png", "2low.webp", "base.png", storage.path(KEYS[False])):
+        os.utime(tmp_path / name, (old, old))
+
+    assert storage.collect_garbage(60, 0) == 3
+    assert [path.name for path in tmp_path.rglob("*") if path.is_file()] == [
+        "base.png"
+    ]
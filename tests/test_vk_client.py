@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from app.db import dependencies
+from app.db.dependencies import VkApiError
+from app.db.dependencies import VkClient
+
+web = pytest.importorskip("aiohttp.web")
+test_utils = pytest.importorskip("aiohttp.test_utils")
+
+
+async def users_get(request):
+    reply = request.query["user_ids"]
+    if reply == "slow":
+        await asyncio.sleep(1)
+    if reply == "error":
+        return web.json_response(
+            {"error": {"error_code": 5, "error_msg": "User authorization failed"}}
+        )
+    if reply == "empty":
+        return web.json_response({})
+    if reply == "broken":
+        return web.Response(text="<html>Bad Gateway</html>", status=502)
+    return web.json_response(
+        {"response": [{"id": 1, "first_name": "Ivan", "last_name": "Ivanov"}]}
+    )
+
+
+async def call_fake_vk(monkeypatch, user_ids: str):
+    app = web.Application()
+    app.router.add_get("/method/users.get", users_get)
+    async with test_utils.TestServer(app) as server:
+        monkeypatch.setattr(dependencies, "VK_API_URL", str(server.make_url("/method")))
+        monkeypatch.setattr(dependencies, "VK_READ_TIMEOUT", 0.1)
+        monkeypatch.setattr(dependencies, "VK_SERVICE", "service-token")
+        client = VkClient()
+        try:
+            return await client.call("users.get", user_ids=user_ids)
+        finally:
+            await client.close()
+
+
+def test_call_returns_response(monkeypatch):
+    users = asyncio.run(call_fake_vk(monkeypatch, "1"))
+    assert users == [{"id": 1, "first_name": "Ivan", "last_name": "Ivanov"}]
+
+
+@pytest.mark.parametrize(
+    "user_ids, reason",
+    [
+        ("slow", "ServerTimeoutError"),
+        ("error", "api_error"),
+        ("empty", "api_error"),
+        ("broken", "JSONDecodeError"),
+    ],
+)
+def test_call_failures_raise_vk_api_error(monkeypatch, user_ids, reason):
+    errors = dependencies.call_errors.labels("users.get", reason)
+    before = errors.value
+
+    with pytest.raises(VkApiError):
+        asyncio.run(call_fake_vk(monkeypatch, user_ids))
+    assert errors.value == before + 1